@@ -0,0 +1,240 @@
+"""Keep the schedules of completed seasons on disk, in a compact columnar format.
+
+Completed seasons never change, so each team's schedule is fetched once, written to its own file
+and from then on read from there (memory-mapped) instead of the NHL API or redis.
+
+Each file holds a header, one column per game field and a table with the (deduplicated) strings;
+all numbers are little-endian:
+
+    header:  magic (4s), format version (H), season (I), number of games (I),
+             index of the timestamp in the string table (I)
+    columns: game_id (q), start (q, UNIX time), length (I, seconds), home_score (H),
+             away_score (H), ended (B), and the string table indices (I) of
+             home_team_abbrev, home_team_name, away_team_abbrev, away_team_name, venue and
+             where_to_watch (joined with newlines)
+    strings: number of strings (I), their offsets into the data (I, one more than the strings),
+             and the UTF-8 data
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from os import getenv
+from os.path import abspath, dirname, exists, join
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Tuple
+
+from utils import Game, LRUCache, Schedule, TeamAbbrev
+
+logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
+
+ARCHIVE_DIR = getenv("ARCHIVE_DIR", join(dirname(abspath(__file__)), "archive"))
+# How many archived schedules are kept in memory after being read.
+ARCHIVE_CACHE_SIZE = int(getenv("ARCHIVE_CACHE_SIZE", "16"))
+
+MAGIC = b"PDXA"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIII")
+# Numeric columns, in the order they're written.
+NUMBER_COLUMNS = (
+    ("game_id", "q"),
+    ("start", "q"),
+    ("length", "I"),
+    ("home_score", "H"),
+    ("away_score", "H"),
+    ("ended", "B"),
+)
+# Columns with the index of each value in the string table.
+STRING_COLUMNS = (
+    "home_team_abbrev",
+    "home_team_name",
+    "away_team_abbrev",
+    "away_team_name",
+    "venue",
+    "where_to_watch",
+)
+START_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class ArchiveError(Exception):
+    """Raised when an archive file can't be read."""
+
+
+def _game_row(game: Game) -> Dict:
+    """Return the values of each column for the game."""
+    return {
+        "game_id": game.game_id,
+        "start": int(game.start.timestamp()),
+        "length": int(game.length.total_seconds()),
+        "home_score": game.home_score,
+        "away_score": game.away_score,
+        "ended": int(game.ended),
+        "home_team_abbrev": game.home_team_abbrev,
+        "home_team_name": game.home_team_name,
+        "away_team_abbrev": game.away_team_abbrev,
+        "away_team_name": game.away_team_name,
+        "venue": game.venue,
+        "where_to_watch": "\n".join(game.where_to_watch),
+    }
+
+
+def encode_schedule(schedule: Schedule) -> bytes:
+    """Encode the schedule in the archive format."""
+    strings: Dict[str, int] = {}
+
+    def string_index(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    rows = [_game_row(g) for g in schedule.games]
+    count = len(rows)
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            schedule.season,
+            count,
+            string_index(schedule.timestamp),
+        )
+    ]
+    for name, code in NUMBER_COLUMNS:
+        parts.append(struct.pack(f"<{count}{code}", *(r[name] for r in rows)))
+    for name in STRING_COLUMNS:
+        parts.append(struct.pack(f"<{count}I", *(string_index(r[name]) for r in rows)))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    parts.append(struct.pack(f"<I{len(offsets)}I", len(encoded), *offsets))
+    parts.extend(encoded)
+    return b"".join(parts)
+
+
+def decode_schedule(team: TeamAbbrev, data: bytes) -> Schedule:
+    """Decode a schedule from the archive format (any buffer, e.g., a memory-mapped file)."""
+    try:
+        magic, version, season, count, timestamp_index = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ArchiveError(f"Unsupported archive format: {magic!r} v{version}")
+
+        offset = HEADER.size
+        columns: Dict[str, Tuple] = {}
+        for name, code in NUMBER_COLUMNS:
+            column = struct.Struct(f"<{count}{code}")
+            columns[name] = column.unpack_from(data, offset)
+            offset += column.size
+        for name in STRING_COLUMNS:
+            column = struct.Struct(f"<{count}I")
+            columns[name] = column.unpack_from(data, offset)
+            offset += column.size
+
+        (string_count,) = struct.unpack_from("<I", data, offset)
+        offsets = struct.unpack_from(f"<{string_count + 1}I", data, offset + 4)
+        start = offset + 4 + 4 * (string_count + 1)
+        strings = [
+            bytes(data[start + offsets[i] : start + offsets[i + 1]]).decode("utf-8")
+            for i in range(string_count)
+        ]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ArchiveError(f"Corrupted archive for {team.name}: {e!r}") from e
+
+    games: List[Game] = []
+    for i in range(count):
+        where_to_watch = strings[columns["where_to_watch"][i]]
+        games.append(
+            Game(
+                game_id=columns["game_id"][i],
+                home_team_abbrev=strings[columns["home_team_abbrev"][i]],
+                home_team_name=strings[columns["home_team_name"][i]],
+                away_team_abbrev=strings[columns["away_team_abbrev"][i]],
+                away_team_name=strings[columns["away_team_name"][i]],
+                start_utc_timestamp=datetime.fromtimestamp(
+                    columns["start"][i], timezone.utc
+                ).strftime(START_FORMAT),
+                length=timedelta(seconds=columns["length"][i]),
+                ended=bool(columns["ended"][i]),
+                home_score=columns["home_score"][i],
+                away_score=columns["away_score"][i],
+                venue=strings[columns["venue"][i]],
+                where_to_watch=where_to_watch.split("\n") if where_to_watch else [],
+            )
+        )
+    return Schedule(
+        team=team, season=season, games=games, timestamp=strings[timestamp_index]
+    )
+
+
+class ScheduleArchive:
+    """Reads and writes archived schedules, keeping the most recently used ones in memory."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR) -> None:
+        self.directory = directory
+        self._schedules: "LRUCache[Tuple[TeamAbbrev, int], Schedule]" = LRUCache(
+            ARCHIVE_CACHE_SIZE
+        )
+        # Saves run in worker threads.
+        self._lock = threading.Lock()
+
+    def _path(self, team: TeamAbbrev, season: int) -> str:
+        """Return where the team's schedule for the season is stored."""
+        return join(self.directory, str(season), f"{team.name}.bin")
+
+    def _remember(self, schedule: Schedule) -> None:
+        """Keep the schedule in memory, evicting the least recently used ones."""
+        with self._lock:
+            self._schedules.put((schedule.team, schedule.season), schedule)
+
+    def load(self, team: TeamAbbrev, season: int) -> Optional[Schedule]:
+        """Return the archived schedule of the team for the season, if there is a usable one."""
+        with self._lock:
+            schedule = self._schedules.get((team, season))
+            if schedule is not None:
+                return schedule
+
+        path = self._path(team, season)
+        if not exists(path):
+            return None
+        try:
+            # Map the file instead of reading it, so its pages are shared through the OS page cache.
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                schedule = decode_schedule(team, data)
+        except (ArchiveError, ValueError, OSError) as e:
+            # Treat it as missing, so it's fetched and archived again; an empty file can't be mapped.
+            logger.warning("Ignoring archive at %s: %r", path, e)
+            return None
+        self._remember(schedule)
+        return schedule
+
+    def save(self, schedule: Schedule) -> None:
+        """Store the schedule; the file is replaced at once, so readers never see a partial one.
+
+        If the file can't be written (e.g., the disk is read-only), the schedule is only kept in memory.
+        """
+        self._remember(schedule)
+        path = self._path(schedule.team, schedule.season)
+        temp_path = None
+        try:
+            os.makedirs(dirname(path), exist_ok=True)
+            with NamedTemporaryFile(dir=dirname(path), delete=False) as f:
+                temp_path = f.name
+                f.write(encode_schedule(schedule))
+                # Make sure the data is on disk before the file is renamed, or a crash could leave
+                # an empty file in its place.
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error("Couldn't archive schedule at %s: %r", path, e)
+            if temp_path is not None:
+                with suppress(OSError):
+                    os.remove(temp_path)
+
+
+# Share the archive for all requests.
+schedule_archive: ScheduleArchive = ScheduleArchive()
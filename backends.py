@@ -0,0 +1,284 @@
+import fnmatch
+import re
+from abc import ABC, abstractmethod
+from os import getenv
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+# Atomically delete a key only if it still holds the given value (e.g., a lock's token).
+DELETE_IF_EQUAL_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+# How many keys to ask for in each step of a scan.
+SCAN_COUNT = 1000
+
+
+def _matches(key: str, pattern: str) -> bool:
+    """Check if the key matches the redis glob-style pattern."""
+    # Redis escapes special characters with a backslash; fnmatch puts them between brackets.
+    return fnmatch.fnmatchcase(key, re.sub(r"\\(.)", r"[\1]", pattern))
+
+
+class CacheBackend(ABC):
+    """The storage operations the cache needs; each call is (at most) one round trip.
+
+    Calls are awaited on the event loop, so a slow server never blocks other requests.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the value stored in key, if any."""
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Return the values stored in each of the keys, in the same order."""
+
+    @abstractmethod
+    async def set_many(self, values: Dict[str, str], ttl: Optional[int] = None) -> None:
+        """Store all the values at once, expiring after ttl seconds if it's given."""
+
+    @abstractmethod
+    async def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        """Store the value (expiring after ttl seconds) unless the key exists; return if it was stored."""
+
+    @abstractmethod
+    async def delete_if_equal(self, key: str, value: str) -> None:
+        """Delete the key if it still holds the given value."""
+
+    @abstractmethod
+    async def scan_keys(self, pattern: str) -> List[str]:
+        """Return all keys that match the glob-style pattern."""
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """Increase and return the count stored in key."""
+
+    @abstractmethod
+    async def hincrby(self, key: str, field: str, increment: int) -> int:
+        """Increase and return the value of the field in the hash stored in key."""
+
+    @abstractmethod
+    async def hincrby_many(self, key: str, increments: Dict[str, int]) -> None:
+        """Increase the values of multiple fields in the hash stored in key."""
+
+    @abstractmethod
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        """Return all fields and values (as strings) of the hash stored in key."""
+
+    async def aclose(self) -> None:
+        """Close the connections to the server, if there are any."""
+
+
+class UpstashBackend(CacheBackend):
+    """Stores the cache in Upstash (or any server speaking its REST API, see compose.yaml)."""
+
+    def __init__(self, client: Any = None) -> None:
+        if client is None:
+            # Imported here because the client is slow to import and only needed for this backend.
+            from upstash_redis.asyncio import Redis
+
+            client = Redis(
+                url=getenv("REDIS_URL", "http://localhost:8079"),
+                token=getenv("REDIS_TOKEN", "example_token"),
+            )
+        self._db = client
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._db.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return await self._db.mget(*keys) if keys else []
+
+    async def set_many(self, values: Dict[str, str], ttl: Optional[int] = None) -> None:
+        if ttl is None:
+            await self._db.mset(values)
+            return
+        # MSET can't set an expiration, so send a SET for each key in a single request.
+        pipeline = self._db.pipeline()
+        for key, value in values.items():
+            pipeline.set(key, value, ex=ttl)
+        await pipeline.exec()
+
+    async def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        return bool(await self._db.set(key, value, nx=True, ex=ttl))
+
+    async def delete_if_equal(self, key: str, value: str) -> None:
+        await self._db.eval(DELETE_IF_EQUAL_SCRIPT, keys=[key], args=[value])
+
+    async def scan_keys(self, pattern: str) -> List[str]:
+        keys: List[str] = []
+        cursor = 0
+        while True:
+            cursor, found = await self._db.scan(cursor, match=pattern, count=SCAN_COUNT)
+            keys.extend(found)
+            if cursor == 0:
+                # No more keys to find.
+                return keys
+
+    async def incr(self, key: str) -> int:
+        return await self._db.incr(key)
+
+    async def hincrby(self, key: str, field: str, increment: int) -> int:
+        return await self._db.hincrby(key, field, increment)
+
+    async def hincrby_many(self, key: str, increments: Dict[str, int]) -> None:
+        pipeline = self._db.pipeline()
+        for field, increment in increments.items():
+            pipeline.hincrby(key, field, increment)
+        await pipeline.exec()
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return await self._db.hgetall(key)
+
+    async def aclose(self) -> None:
+        await self._db.close()
+
+
+class RedisBackend(CacheBackend):
+    """Stores the cache in redis, talking its native protocol over a pool of persistent connections."""
+
+    def __init__(self, client: Any = None) -> None:
+        if client is None:
+            # Only needed for this backend.
+            import redis.asyncio as redis
+
+            client = redis.Redis(
+                connection_pool=redis.ConnectionPool.from_url(
+                    getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+                    max_connections=int(getenv("CACHE_REDIS_MAX_CONNECTIONS", "16")),
+                    socket_timeout=float(getenv("CACHE_REDIS_TIMEOUT", "5")),
+                    decode_responses=True,
+                )
+            )
+        self._db = client
+        self._delete_if_equal = self._db.register_script(DELETE_IF_EQUAL_SCRIPT)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._db.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return await self._db.mget(keys) if keys else []
+
+    async def set_many(self, values: Dict[str, str], ttl: Optional[int] = None) -> None:
+        if ttl is None:
+            await self._db.mset(values)
+            return
+        # MSET can't set an expiration, so send a SET for each key in a single round trip.
+        pipeline = self._db.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(key, value, ex=ttl)
+        await pipeline.execute()
+
+    async def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        return bool(await self._db.set(key, value, nx=True, ex=ttl))
+
+    async def delete_if_equal(self, key: str, value: str) -> None:
+        # Runs the script by its hash, only sending it again if the server doesn't have it.
+        await self._delete_if_equal(keys=[key], args=[value])
+
+    async def scan_keys(self, pattern: str) -> List[str]:
+        return [k async for k in self._db.scan_iter(match=pattern, count=SCAN_COUNT)]
+
+    async def incr(self, key: str) -> int:
+        return await self._db.incr(key)
+
+    async def hincrby(self, key: str, field: str, increment: int) -> int:
+        return await self._db.hincrby(key, field, increment)
+
+    async def hincrby_many(self, key: str, increments: Dict[str, int]) -> None:
+        # Send all increments in a single round trip.
+        pipeline = self._db.pipeline(transaction=False)
+        for field, increment in increments.items():
+            pipeline.hincrby(key, field, increment)
+        await pipeline.execute()
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return await self._db.hgetall(key)
+
+    async def aclose(self) -> None:
+        await self._db.aclose()
+
+
+class MemoryBackend(CacheBackend):
+    """Keeps the cache in this process; for local development and tests (nothing is shared or persisted)."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, str] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._hashes: Dict[str, Dict[str, int]] = {}
+
+    def _expire(self, key: str) -> None:
+        """Drop the key if its time to live is over."""
+        expires_at = self._expires_at.get(key)
+        if expires_at is not None and expires_at <= monotonic():
+            self._values.pop(key, None)
+            self._expires_at.pop(key, None)
+
+    async def get(self, key: str) -> Optional[str]:
+        self._expire(key)
+        return self._values.get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        for key in keys:
+            self._expire(key)
+        return [self._values.get(k) for k in keys]
+
+    async def set_many(self, values: Dict[str, str], ttl: Optional[int] = None) -> None:
+        self._values.update(values)
+        for key in values:
+            if ttl is None:
+                self._expires_at.pop(key, None)
+            else:
+                self._expires_at[key] = monotonic() + ttl
+
+    async def set_if_absent(self, key: str, value: str, ttl: int) -> bool:
+        self._expire(key)
+        if key in self._values:
+            return False
+        self._values[key] = value
+        self._expires_at[key] = monotonic() + ttl
+        return True
+
+    async def delete_if_equal(self, key: str, value: str) -> None:
+        if self._values.get(key) == value:
+            self._values.pop(key)
+            self._expires_at.pop(key, None)
+
+    async def scan_keys(self, pattern: str) -> List[str]:
+        for key in list(self._expires_at):
+            self._expire(key)
+        return [k for k in self._values if _matches(k, pattern)]
+
+    async def incr(self, key: str) -> int:
+        count = int(self._values.get(key, 0)) + 1
+        self._values[key] = str(count)
+        return count
+
+    async def hincrby(self, key: str, field: str, increment: int) -> int:
+        fields = self._hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + increment
+        return fields[field]
+
+    async def hincrby_many(self, key: str, increments: Dict[str, int]) -> None:
+        fields = self._hashes.setdefault(key, {})
+        for field, increment in increments.items():
+            fields[field] = fields.get(field, 0) + increment
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        return {f: str(v) for f, v in self._hashes.get(key, {}).items()}
+
+
+def create_backend(name: str) -> CacheBackend:
+    """Create the backend with the given name: "upstash", "redis" or "memory"."""
+    backends = {
+        "upstash": UpstashBackend,
+        "redis": RedisBackend,
+        "memory": MemoryBackend,
+    }
+    if name not in backends:
+        raise ValueError(
+            f"Unknown cache backend '{name}'; expected one of: {', '.join(backends)}"
+        )
+    return backends[name]()
@@ -0,0 +1,104 @@
+import fnmatch
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    """In-memory stand-in for the parts of upstash_redis.asyncio.Redis that RedisCache uses.
+
+    Every method that would be a request to redis increases `requests`, so benchmarks can
+    report how many round trips a code path makes.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Any] = {}
+        self._hashes: Dict[str, Dict[str, int]] = {}
+        self.requests = 0
+
+    def stored_bytes(self) -> int:
+        """Return roughly how much memory the stored keys and values take in redis."""
+        return sum(len(str(k)) + len(str(v)) for k, v in self._values.items())
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.requests += 1
+        return self._values.get(key)
+
+    async def mget(self, *keys: str) -> List[Optional[Any]]:
+        self.requests += 1
+        return [self._values.get(k) for k in keys]
+
+    async def set(
+        self, key: str, value: Any, nx: bool = False, ex: Optional[int] = None
+    ):
+        # Expiration (ex) is ignored; benchmarks don't run long enough for it to matter.
+        self.requests += 1
+        if nx and key in self._values:
+            return None
+        self._values[key] = value
+        return True
+
+    async def mset(self, values: Dict[str, Any]) -> bool:
+        self.requests += 1
+        self._values.update(values)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        self.requests += 1
+        return sum(self._values.pop(k, None) is not None for k in keys)
+
+    async def scan(
+        self, cursor: int, match: Optional[str] = None, count: Optional[int] = None
+    ) -> Tuple[int, List[str]]:
+        # All matching keys are returned in a single page.
+        self.requests += 1
+        # Redis escapes special characters with a backslash; fnmatch puts them between brackets.
+        pattern = re.sub(r"\\(.)", r"[\1]", match or "*")
+        return 0, [k for k in self._values if fnmatch.fnmatchcase(k, pattern)]
+
+    async def incr(self, key: str) -> int:
+        self.requests += 1
+        self._values[key] = int(self._values.get(key, 0)) + 1
+        return self._values[key]
+
+    async def hincrby(self, key: str, field: str, increment: int) -> int:
+        self.requests += 1
+        return self._hincrby(key, field, increment)
+
+    def _hincrby(self, key: str, field: str, increment: int) -> int:
+        fields = self._hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + increment
+        return fields[field]
+
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        # Like the real client, values come back as strings.
+        self.requests += 1
+        return {f: str(v) for f, v in self._hashes.get(key, {}).items()}
+
+    async def eval(self, script: str, keys: List[str], args: List[Any]) -> int:
+        # Only the script used by RedisCache.release_lock is supported: delete the key if it holds the token.
+        self.requests += 1
+        if self._values.get(keys[0]) == args[0]:
+            del self._values[keys[0]]
+            return 1
+        return 0
+
+    def pipeline(self) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them all in a single request when executed."""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._commands: List[Callable[[], Any]] = []
+
+    def hincrby(self, key: str, field: str, increment: int) -> None:
+        self._commands.append(lambda: self._redis._hincrby(key, field, increment))
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None) -> None:
+        self._commands.append(lambda: self._redis._values.__setitem__(key, value))
+
+    async def exec(self) -> List[Any]:
+        self._redis.requests += 1
+        return [command() for command in self._commands]
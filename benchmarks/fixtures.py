@@ -0,0 +1,76 @@
+"""Synthetic NHL API responses for benchmarks, so runs don't depend on (or hit) the real API.
+
+A whole league season is generated once per run: every game is played by two teams and appears,
+with the same ID and details, in the responses of both. The season is placed around today, so
+every run sees the same games with the same share of them in the past.
+"""
+
+import copy
+import random
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List
+
+from utils import TeamAbbrev
+
+# Seasons start this long before today, so schedules have past and future games.
+SEASON_OFFSET = timedelta(days=90)
+# Each day, half the teams play; over the season, each team plays about 82 games.
+SEASON_DAYS = 164
+GAMES_PER_DAY = len(TeamAbbrev) // 4
+SEASON = 20252026
+START_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+BROADCASTS = [
+    {"countryCode": "US", "network": "ESPN+"},
+    {"countryCode": "CA", "network": "SN, TVAS"},
+]
+
+
+@lru_cache(maxsize=1)
+def synthetic_season(today: datetime) -> List[Dict]:
+    """Generate the games of a league season around today, the same for the same day."""
+    rnd = random.Random(SEASON)
+    teams = [t.name for t in TeamAbbrev]
+    first_day = today - SEASON_OFFSET
+
+    games = []
+    for day in range(SEASON_DAYS):
+        rnd.shuffle(teams)
+        for i in range(GAMES_PER_DAY):
+            home, away = teams[2 * i], teams[2 * i + 1]
+            start = first_day + timedelta(days=day, hours=rnd.choice([23, 24, 26]))
+            is_over = start + timedelta(hours=3) < today
+            games.append(
+                {
+                    "id": SEASON // 10000 * 1000000 + 20000 + len(games) + 1,
+                    "startTimeUTC": start.strftime(START_FORMAT),
+                    "gameState": "OFF" if is_over else "FUT",
+                    "venue": {"default": f"{home} Arena"},
+                    "homeTeam": {
+                        "abbrev": home,
+                        "commonName": {"default": home},
+                        "score": rnd.randint(0, 6) if is_over else 0,
+                    },
+                    "awayTeam": {
+                        "abbrev": away,
+                        "commonName": {"default": away},
+                        "score": rnd.randint(0, 6) if is_over else 0,
+                    },
+                    "tvBroadcasts": BROADCASTS if len(games) % 3 else BROADCASTS[:1],
+                }
+            )
+    return games
+
+
+def load_schedule(team: TeamAbbrev) -> Dict:
+    """Return the NHL API response for the team's schedule in the synthetic season."""
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    games = [
+        game
+        for game in synthetic_season(today)
+        if team.name in (game["homeTeam"]["abbrev"], game["awayTeam"]["abbrev"])
+    ]
+    # Callers may change the response, as they could with a real one.
+    return {"currentSeason": SEASON, "games": copy.deepcopy(games)}
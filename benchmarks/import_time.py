@@ -0,0 +1,79 @@
+"""Check how long a cold process takes to import the app, and that slow imports stay deferred.
+
+Exits with an error if the median import time is over the budget, or if any of the modules that
+should only be imported on first use is imported with the app:
+
+    python -m benchmarks.import_time [--budget-ms 800] [--runs 7]
+
+Both are also checked by tests/test_import_time.py; the budget only with --run-timing.
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from os.path import abspath, dirname
+from typing import List
+
+ROOT_DIR = dirname(dirname(abspath(__file__)))
+
+# Modules that are only needed once the app handles requests that use them.
+DEFERRED_MODULES = ["httpx", "jinja2", "redis", "upstash_redis"]
+
+
+def measure_import_ms() -> float:
+    """Import the app in a new process and return how long it took (in milliseconds)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time: <self us> | <cumulative us> | <module>".
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$", result.stderr, re.M)
+    if match is None:
+        raise RuntimeError(f"Couldn't find the import time of main:\n{result.stderr}")
+    return int(match.group(1)) / 1000
+
+
+def find_eager_imports() -> List[str]:
+    """Return the deferred modules that are imported with the app anyway."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, main; "
+            f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))",
+        ],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=800)
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    timings = [measure_import_ms() for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(
+        f"import main: median {median:.1f}ms, min {min(timings):.1f}ms, max {max(timings):.1f}ms"
+        f" (budget {args.budget_ms:.0f}ms)"
+    )
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"Over budget by {median - args.budget_ms:.1f}ms.")
+        failed = True
+    eager = find_eager_imports()
+    if eager:
+        print(f"Imported with the app instead of on first use: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
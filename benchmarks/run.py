@@ -0,0 +1,270 @@
+"""Benchmark the hot paths of the app against a synthetic season, without the NHL API or redis.
+
+Runs microbenchmarks (parse, filter, render, next/last, cache hits) and drives the main routes
+through the ASGI app to measure requests per second and latency percentiles.
+Results are saved as JSON so runs can be compared:
+
+    python -m benchmarks.run [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from os.path import abspath, dirname, join
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+import cache
+import main
+from backends import UpstashBackend
+from benchmarks.fake_redis import FakeRedis
+from benchmarks.fixtures import load_schedule
+from utils import CalendarType, Schedule, TeamAbbrev
+
+RESULTS_DIR = join(dirname(abspath(__file__)), "results")
+
+# Routes driven end to end; each one is requested for a rotating set of teams.
+ROUTES = {
+    "calendar": "/full/{team}.ics",
+    "calendar_home": "/home/{team}.ics",
+    "calendar_not_modified": "/full/{team}.ics",
+    "next": "/next/full/{team}",
+    "last": "/last/full/{team}",
+    "next_all_teams": "/next/full",
+    "combo": "/combo/full.ics?teams={team},TOR,MTL",
+}
+TEAMS = [TeamAbbrev.BOS, TeamAbbrev.CAR, TeamAbbrev.EDM, TeamAbbrev.VAN]
+
+
+def _summarize(durations: List[float]) -> Dict[str, Any]:
+    """Return the mean and percentiles (in microseconds) of the durations (in seconds)."""
+    ordered = sorted(durations)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1e6
+
+    return {
+        "n": len(ordered),
+        "mean_us": sum(ordered) / len(ordered) * 1e6,
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99),
+    }
+
+
+async def _time(
+    func: Callable[[], Awaitable[Any]], iterations: int, warmup: int = 10
+) -> Dict[str, Any]:
+    """Time each call of the async function."""
+    for _ in range(warmup):
+        await func()
+    durations = []
+    for _ in range(iterations):
+        start = perf_counter()
+        await func()
+        durations.append(perf_counter() - start)
+    return _summarize(durations)
+
+
+def _install_fakes() -> FakeRedis:
+    """Serve schedules from the synthetic season and use an in-memory redis."""
+    redis = FakeRedis()
+    cache.cache.backend = UpstashBackend(redis)
+
+    async def fetch_schedule(team_abbrev: str) -> Dict:
+        return load_schedule(TeamAbbrev(team_abbrev))
+
+    main.fetch_schedule = fetch_schedule
+    return redis
+
+
+async def run_micro(iterations: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark the building blocks of a request, one at a time."""
+    team = TeamAbbrev.BOS
+    data = load_schedule(team)
+    schedule = await main._parse_schedule(team, data)
+    now = datetime.now(timezone.utc)
+
+    async def parse() -> Schedule:
+        return await main._parse_schedule(team, data)
+
+    async def parse_incremental() -> Schedule:
+        return await main._parse_schedule(team, data, previous=schedule)
+
+    async def load_cached() -> Schedule:
+        return await main._load_schedule(await main._dump_schedule(schedule))
+
+    async def filter_home() -> List:
+        return schedule.games_for(CalendarType.HOME)
+
+    async def next_last() -> Any:
+        return (
+            schedule.next_game(CalendarType.FULL, now),
+            schedule.last_game(CalendarType.FULL, now),
+        )
+
+    async def render() -> bytes:
+        return b"".join(
+            main._render_calendar(
+                team, CalendarType.FULL, schedule.games_for(CalendarType.FULL), now
+            )
+        )
+
+    async def cache_hit() -> Schedule:
+        return await main._create_complete_schedule(team)
+
+    await main._create_complete_schedule(team)
+    benchmarks = {
+        "parse": parse,
+        "parse_incremental": parse_incremental,
+        "load_cached": load_cached,
+        "filter_home": filter_home,
+        "next_last": next_last,
+        "render_full": render,
+        "cache_hit": cache_hit,
+    }
+    return {name: await _time(func, iterations) for name, func in benchmarks.items()}
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    paths: List[str],
+    requests: int,
+    concurrency: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Send the requests (rotating through the paths) from concurrent clients."""
+    durations: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for i in remaining:
+            start = perf_counter()
+            response = await client.get(paths[i % len(paths)], headers=headers)
+            durations.append(perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = perf_counter() - start
+
+    summary = _summarize(durations)
+    summary["rps"] = len(durations) / elapsed
+    summary["statuses"] = {str(k): v for k, v in sorted(statuses.items())}
+    return summary
+
+
+async def run_e2e(requests: int, concurrency: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark the main routes through the ASGI app, with warm caches."""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        results = {}
+        for name, route in ROUTES.items():
+            paths = [route.format(team=t.name) for t in TEAMS]
+            headers = None
+            if name == "calendar_not_modified":
+                # Conditional requests from clients that already have the current calendar.
+                response = await client.get(paths[0])
+                headers = {"If-None-Match": response.headers["etag"]}
+                paths = paths[:1]
+            # Warm the caches (schedules and rendered calendars) before measuring.
+            for path in paths:
+                await client.get(path, headers=headers)
+            results[name] = await _drive(client, paths, requests, concurrency, headers)
+        return results
+
+
+def _git_commit() -> str:
+    """Return the current commit, if it can be found."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(results: Dict, baseline: Dict) -> None:
+    """Print how each result changed from the baseline."""
+    for section, metric in (("micro", "p50_us"), ("e2e", "rps")):
+        for name, result in results[section].items():
+            before = baseline.get(section, {}).get(name, {}).get(metric)
+            if not before:
+                continue
+            change = (result[metric] - before) / before * 100
+            print(
+                f"{section:5} {name:22} {metric:6} {before:12.1f} -> {result[metric]:12.1f} ({change:+.1f}%)"
+            )
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    """Run all benchmarks and return their results."""
+    redis = _install_fakes()
+    micro = await run_micro(args.iterations)
+    e2e = await run_e2e(args.requests, args.concurrency)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "redis_requests": redis.requests,
+            "redis_bytes": redis.stored_bytes(),
+        },
+        "micro": micro,
+        "e2e": e2e,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", help="where to save the results (JSON)")
+    parser.add_argument("--compare", help="results (JSON) of a previous run")
+    args = parser.parse_args()
+
+    # Per-request logging would dominate the timings, unless a level is set explicitly.
+    if "LOG_LEVEL" not in os.environ:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+    for name, result in results["micro"].items():
+        print(
+            f"micro {name:22} p50 {result['p50_us']:10.1f}us  p99 {result['p99_us']:10.1f}us"
+        )
+    for name, result in results["e2e"].items():
+        print(
+            f"e2e   {name:22} {result['rps']:8.0f} rps  p50 {result['p50_us'] / 1000:7.2f}ms"
+            f"  p99 {result['p99_us'] / 1000:7.2f}ms  {result['statuses']}"
+        )
+
+    output = args.output or join(
+        RESULTS_DIR,
+        f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{results['meta']['commit']}.json",
+    )
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            _compare(results, json.load(f))
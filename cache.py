@@ -1,12 +1,27 @@
+import asyncio
+import inspect
+import json
 import logging
+import zlib
+from base64 import b64decode, b64encode
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 from os import getenv
-from typing import Any, Callable, Dict, List, Optional
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+from uuid import uuid4
 
 from pydantic import BaseModel
-from upstash_redis import Redis
 
-from utils import UPDATE_FREQ
+from backends import CacheBackend, create_backend
+from metrics import CounterFamily, register, span
+from utils import UPDATE_FREQ, LRUCache, env_flag
+
+try:
+    import msgpack
+except ImportError:
+    # The compact codec falls back to JSON without msgpack.
+    msgpack = None
 
 logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
 
@@ -18,75 +33,458 @@ class CacheEntry(BaseModel):
     data: Any
 
 
+class JsonCodec:
+    """Stores cache entries as JSON text (the original format)."""
+
+    def encode(self, entry: CacheEntry) -> str:
+        """Serialize the entry."""
+        return entry.model_dump_json()
+
+    def decode(self, raw: str) -> CacheEntry:
+        """Deserialize an entry created by encode."""
+        return CacheEntry.model_validate_json(raw)
+
+
+class CompactCodec:
+    """Stores cache entries in a compact binary format, as text that's safe for the REST API.
+
+    The text is PREFIX followed by the base64 encoding of:
+      - 1 byte with the format version (msgpack or JSON, if msgpack isn't installed);
+      - 1 byte with flags (whether the payload is compressed);
+      - the payload: [timestamp in microseconds since the epoch, data].
+    """
+
+    PREFIX = "pdx:"
+    MSGPACK_VERSION = 1
+    JSON_VERSION = 2
+    COMPRESSED_FLAG = 0b1
+    EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    def __init__(self, compress: bool = True) -> None:
+        self.compress = compress
+
+    def encode(self, entry: CacheEntry) -> str:
+        """Serialize the entry."""
+        timestamp = (entry.timestamp - self.EPOCH) // timedelta(microseconds=1)
+        if msgpack is not None:
+            version = self.MSGPACK_VERSION
+            payload = msgpack.packb([timestamp, entry.data])
+        else:
+            version = self.JSON_VERSION
+            payload = json.dumps(
+                [timestamp, entry.data], separators=(",", ":")
+            ).encode()
+
+        flags = 0
+        if self.compress:
+            flags |= self.COMPRESSED_FLAG
+            payload = zlib.compress(payload)
+
+        return self.PREFIX + b64encode(bytes([version, flags]) + payload).decode(
+            "ascii"
+        )
+
+    def decode(self, raw: str) -> CacheEntry:
+        """Deserialize an entry created by encode."""
+        blob = b64decode(raw[len(self.PREFIX) :])
+        version, flags, payload = blob[0], blob[1], blob[2:]
+        if flags & self.COMPRESSED_FLAG:
+            payload = zlib.decompress(payload)
+
+        if version == self.MSGPACK_VERSION:
+            if msgpack is None:
+                raise ValueError("Cache entry needs msgpack, which is not installed.")
+            timestamp, data = msgpack.unpackb(payload)
+        elif version == self.JSON_VERSION:
+            timestamp, data = json.loads(payload)
+        else:
+            raise ValueError(f"Unknown cache entry format version: {version}")
+
+        return CacheEntry(
+            timestamp=self.EPOCH + timedelta(microseconds=timestamp), data=data
+        )
+
+
+def decode_entry(raw: str) -> CacheEntry:
+    """Deserialize a cache entry stored in any of the supported formats."""
+    if raw.startswith(CompactCodec.PREFIX):
+        return CompactCodec().decode(raw)
+    # Entries stored before the compact format existed are JSON.
+    return JsonCodec().decode(raw)
+
+
+class LocalCacheEntry(BaseModel):
+    """Holds an already-loaded cache entry kept in the process' memory."""
+
+    timestamp: datetime
+    value: Any
+    checked_at: float
+
+
+class LocalCache:
+    """Keeps the most recently used entries in memory, in front of the redis cache."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self._entries: "LRUCache[str, LocalCacheEntry]" = LRUCache(max_entries)
+        self.ttl = ttl
+
+    @property
+    def max_entries(self) -> int:
+        """How many entries are kept at most."""
+        return self._entries.max_size
+
+    def get(self, key: str) -> Optional[LocalCacheEntry]:
+        """Return the entry for the key, if there is one."""
+        return self._entries.get(key)
+
+    def is_checked(self, local_entry: LocalCacheEntry) -> bool:
+        """Check if the entry was confirmed to match redis recently enough to skip checking again."""
+        return monotonic() - local_entry.checked_at <= self.ttl
+
+    def set(self, key: str, timestamp: datetime, value: Any) -> LocalCacheEntry:
+        """Store the loaded value for the key, evicting the least recently used entries if full."""
+        local_entry = LocalCacheEntry(
+            timestamp=timestamp, value=value, checked_at=monotonic()
+        )
+        self._entries.put(key, local_entry)
+        return local_entry
+
+    def touch(self, key: str) -> None:
+        """Mark the entry for the key as confirmed to match redis."""
+        local_entry = self._entries.get(key)
+        if local_entry is not None:
+            local_entry.checked_at = monotonic()
+
+    def invalidate(self, key: str) -> None:
+        """Forget the entry for the key."""
+        self._entries.pop(key, None)
+
+
 class RedisCache:
     """Manages the connection to our redis cache."""
 
-    def __init__(self) -> None:
-        self._db = Redis(
-            url=getenv("REDIS_URL", "http://localhost:8079"),
-            token=getenv("REDIS_TOKEN", "example_token"),
-        )
+    def __init__(
+        self,
+        codec: Union[JsonCodec, CompactCodec],
+        backend_factory: Callable[[], CacheBackend],
+    ) -> None:
+        # Where entries are stored (e.g., Upstash or a redis server); it's only created when
+        # first used, so starting a process doesn't wait on the client or its connections.
+        self._backend_factory = backend_factory
+        self._backend: Optional[CacheBackend] = None
+        # New entries are written with this codec; entries in any format can be read.
+        self._codec = codec
 
-    def set(self, key: str, data: Any) -> None:
-        """Store the given data in the cache."""
-        self._db.set(
-            key,
-            CacheEntry(
-                timestamp=datetime.now(timezone.utc), data=data
-            ).model_dump_json(),
+    @property
+    def backend(self) -> CacheBackend:
+        """Return the backend, creating it on first use."""
+        if self._backend is None:
+            self._backend = self._backend_factory()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: CacheBackend) -> None:
+        """Replace the backend (e.g., with an in-memory one)."""
+        self._backend = backend
+
+    async def set(self, key: str, data: Any) -> datetime:
+        """Store the given data in the cache and return the entry's timestamp."""
+        timestamp = datetime.now(timezone.utc)
+        # Store the entry's version (timestamp) alongside it so other processes can cheaply
+        # check whether the copy they keep in memory is still current.
+        await self.backend.set_many(
+            {
+                key: self._codec.encode(CacheEntry(timestamp=timestamp, data=data)),
+                self._version_key(key): timestamp.isoformat(),
+            }
         )
+        return timestamp
+
+    @staticmethod
+    def _version_key(key: str) -> str:
+        """Return the key that holds the version of the entry stored in key."""
+        return f"[VERSION] {key}"
+
+    async def get_version(self, key: str) -> Optional[str]:
+        """Return the version (timestamp) of the entry stored in key, without reading the entry."""
+        return await self.backend.get(self._version_key(key))
 
-    def get(self, key: str) -> Optional[CacheEntry]:
+    async def get(self, key: str) -> Optional[CacheEntry]:
         """Return the stored value for the key."""
-        cached_json = self._db.get(key)
-        if cached_json:
-            return CacheEntry.model_validate_json(cached_json)
+        cached_entry = await self.backend.get(key)
+        if cached_entry:
+            return decode_entry(cached_entry)
         return None
 
-    def get_raw_values(self, key_pattern: str) -> Dict[Any, Any]:
+    async def get_raw_values(self, key_pattern: str) -> Dict[Any, Any]:
         """Return values for keys that match the given pattern without processing/validating."""
-        # Finds all keys that match the pattern.
-        keys_found: List[str] = []
-        cursor = 0
-        while True:
-            cursor, keys = self._db.scan(cursor, match=key_pattern)
-            keys_found.extend(keys)
-            if cursor == 0:
-                # no more keys to find
-                break
-        # Get the value for each key we found.
-        return {k: self._db.get(k) for k in keys_found}
-
-    def incr(self, key: str) -> int:
+        # Finds all keys that match the pattern, then gets all their values in a single request.
+        keys_found = await self.backend.scan_keys(key_pattern)
+        return dict(zip(keys_found, await self.backend.get_many(keys_found)))
+
+    async def set_values(
+        self, values: Dict[str, str], ttl: Optional[int] = None
+    ) -> None:
+        """Store plain values with a single request, expiring after ttl seconds if it's given."""
+        if values:
+            await self.backend.set_many(values, ttl)
+
+    async def get_values(self, keys: List[str]) -> List[Optional[str]]:
+        """Return the plain values stored in the keys with a single request."""
+        return await self.backend.get_many(keys)
+
+    async def incr(self, key: str) -> int:
         """Increase and return the count for specified key."""
-        return self._db.incr(key)
+        return await self.backend.incr(key)
 
-    def set_field_incr(self, key: str, field: str, increment: int = 1) -> int:
+    async def set_field_incr(self, key: str, field: str, increment: int = 1) -> int:
         """Increase and return the value of field inside the key set by increment."""
-        return self._db.hincrby(key, field, increment)
+        return await self.backend.hincrby(key, field, increment)
 
-    def get_set(self, key: str) -> Dict:
+    async def set_fields_incr(self, key: str, increments: Dict[str, int]) -> None:
+        """Increase the value of multiple fields inside the key set with a single request."""
+        await self.backend.hincrby_many(key, increments)
+
+    async def get_set(self, key: str) -> Dict:
         """Return all field/value pairs in the key set."""
-        return self._db.hgetall(key)
+        return await self.backend.hgetall(key)
+
+    async def acquire_lock(self, key: str, token: str, ttl: int) -> bool:
+        """Try to take the lock stored in key; it expires after ttl seconds if never released."""
+        return await self.backend.set_if_absent(key, token, ttl)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Release the lock stored in key if it's still held with the given token."""
+        # Check and delete atomically so we never release a lock taken over by someone else.
+        await self.backend.delete_if_equal(key, token)
+
+    async def aclose(self) -> None:
+        """Close the connections of the backend, if it was created."""
+        if self._backend is not None:
+            await self._backend.aclose()
 
 
 # Create a connection to our redis database.
-cache: RedisCache = RedisCache()
+# Entries are stored in the compact format unless CACHE_CODEC is set to "json".
+# CACHE_BACKEND picks where: "upstash" (REST API), "redis" (native protocol) or "memory".
+cache: RedisCache = RedisCache(
+    codec=(
+        JsonCodec()
+        if getenv("CACHE_CODEC", "compact").lower() == "json"
+        else CompactCodec(compress=env_flag("CACHE_COMPRESSION", True))
+    ),
+    backend_factory=lambda: create_backend(getenv("CACHE_BACKEND", "upstash").lower()),
+)
+
+# Keep already-loaded results in memory so warm requests don't need a round trip to redis.
+local_cache: LocalCache = LocalCache(
+    max_entries=int(getenv("CACHE_LOCAL_MAX_ENTRIES", "256")),
+    # How long (in seconds) an entry in memory is trusted before it's checked against redis.
+    ttl=float(getenv("CACHE_LOCAL_TTL", "30")),
+)
+# Check if redis has a newer version of an entry, instead of reading the entry again.
+LOCAL_VERSION_CHECK = env_flag("CACHE_LOCAL_VERSION_CHECK", True)
+
+# Use a lock in redis so only one process refreshes an entry at a time (for multi-worker deployments).
+DISTRIBUTED_LOCK = env_flag("CACHE_DISTRIBUTED_LOCK", False)
+# How long (in seconds) a refresh can hold the lock before other processes ignore it.
+LOCK_TTL = int(getenv("CACHE_LOCK_TTL", "60"))
+# How long (in seconds) to wait for another process to refresh a missing entry.
+LOCK_WAIT = float(getenv("CACHE_LOCK_WAIT", "10"))
+LOCK_POLL_INTERVAL = 0.25
+
+# Refreshes currently running in this process, so concurrent callers for the same key share them.
+_in_flight: Dict[str, "asyncio.Future[Any]"] = {}
+
+# How many calls were served by a refresh started by another caller:
+#   - "local": awaited a refresh running in this process;
+#   - "distributed": served while another process held the refresh lock.
+coalesced_calls: Counter = Counter()
+register(
+    CounterFamily(
+        "puckdex_cache_coalesced_calls_total",
+        "Calls served by a refresh started by another caller.",
+        label="scope",
+        values=coalesced_calls,
+    )
+)
 
+# How calls to cached functions were served:
+#   - "fresh": from a fresh entry;
+#   - "stale": from a stale entry, while it's refreshed in the background;
+#   - "miss": by waiting for a refresh (no entry, or one that's too old to use).
+lookups: Counter = Counter()
+register(
+    CounterFamily(
+        "puckdex_cache_lookups_total",
+        "Calls to cached functions, by how they were served.",
+        label="result",
+        values=lookups,
+    )
+)
 
-def cache_this(store_transform=(lambda x: x), load_transform=(lambda x: x)):
-    """Create a decorator that can transform the result before/after db operations."""
+
+async def _transform(transform: Callable[[Any], Any], value: Any) -> Any:
+    """Apply the transform to the value, awaiting it if it's a coroutine function."""
+    result = transform(value)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def _load(
+    key: str, load_transform: Callable[[Any], Any]
+) -> Optional[LocalCacheEntry]:
+    """Return the loaded entry for the key, from memory if it's current or from redis otherwise."""
+    local_entry = local_cache.get(key)
+    if local_entry is not None:
+        if local_cache.is_checked(local_entry):
+            return local_entry
+        if (
+            LOCAL_VERSION_CHECK
+            and await cache.get_version(key) == local_entry.timestamp.isoformat()
+        ):
+            # Redis still holds the same version of the entry.
+            local_cache.touch(key)
+            return local_entry
+        local_cache.invalidate(key)
+
+    entry = await cache.get(key)
+    if entry is None:
+        return None
+    value = await _transform(load_transform, entry.data)
+    if value is None:
+        # The entry can't be loaded anymore (e.g., data it refers to has expired).
+        return None
+    return local_cache.set(key, entry.timestamp, value)
+
+
+def _log_background_refresh(
+    key: str,
+    task: "asyncio.Future[Any]",
+    expected_errors: Tuple[Type[BaseException], ...] = (),
+) -> None:
+    """Log the outcome of a refresh that nobody is waiting for."""
+    if task.cancelled():
+        logger.warning("Background refresh for '%s' was cancelled.", key)
+    elif isinstance(task.exception(), expected_errors):
+        # E.g., the upstream is down; the traceback wouldn't tell anything new.
+        logger.warning("Background refresh for '%s' failed: %r", key, task.exception())
+    elif task.exception() is not None:
+        logger.error(
+            "Background refresh for '%s' failed: %s",
+            key,
+            task.exception(),
+            exc_info=task.exception(),
+        )
+
+
+def cache_this(
+    store_transform=(lambda x: x),
+    load_transform=(lambda x: x),
+    freshness: Union[timedelta, Callable[[Any], timedelta]] = UPDATE_FREQ,
+    max_stale: Optional[timedelta] = None,
+    can_refresh: Callable[[], bool] = (lambda: True),
+    expected_errors: Tuple[Type[BaseException], ...] = (),
+):
+    """Create a decorator that can transform the result before/after db operations.
+
+    Entries younger than freshness are returned as they are;
+    freshness can also be a function that returns it for the (loaded) cached value.
+    If max_stale is set, entries younger than max_stale are also returned right away,
+    while a refresh runs in the background (stale-while-revalidate).
+    Older entries (or all stale entries without max_stale) wait for the refresh.
+    The transforms can be coroutine functions; a load_transform that returns None marks
+    the entry as unusable (as if it wasn't cached).
+    Background refreshes are only started while can_refresh() is true (e.g., the upstream is up),
+    and their expected_errors are logged without a traceback.
+    """
 
     def cache_decorator(func) -> Callable[[Any], Any]:
         """Real decorator to cache method results."""
 
-        freshness: timedelta = UPDATE_FREQ
+        async def refresh(key: str, entry: Optional[LocalCacheEntry], *args, **kwargs):
+            """Call the original function and cache its result."""
+            lock_key = f"[LOCK] {key}"
+            lock_token = uuid4().hex
+            if DISTRIBUTED_LOCK and not await cache.acquire_lock(
+                lock_key, lock_token, LOCK_TTL
+            ):
+                # Another process is already refreshing this entry.
+                coalesced_calls["distributed"] += 1
+                if entry:
+                    logger.info(
+                        "Entry for '%s' is being refreshed elsewhere; returning non-fresh cache entry.",
+                        key,
+                    )
+                    return entry.value
+
+                # There's nothing to return yet, so wait a bit for the other process to finish.
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + LOCK_WAIT
+                while loop.time() < deadline:
+                    await asyncio.sleep(LOCK_POLL_INTERVAL)
+                    local_cache.invalidate(key)
+                    new_entry = await _load(key, load_transform)
+                    if new_entry:
+                        logger.info("Entry for '%s' was refreshed elsewhere.", key)
+                        return new_entry.value
+                logger.warning(
+                    "Timed out waiting for '%s' to be refreshed elsewhere.", key
+                )
+                lock_token = ""
+
+            try:
+                new_result = await func(*args, **kwargs)
+                # Cache the new result (in redis and in memory) and return it.
+                with span("cache_set"):
+                    timestamp = await cache.set(
+                        key, await _transform(store_transform, new_result)
+                    )
+                local_cache.set(key, timestamp, new_result)
+                logger.info("Updated cache with new results for '%s'.", key)
+                return new_result
+            finally:
+                if DISTRIBUTED_LOCK and lock_token:
+                    await cache.release_lock(lock_key, lock_token)
+
+        def start_refresh(
+            key: str, entry: Optional[LocalCacheEntry], *args, **kwargs
+        ) -> "asyncio.Future[Any]":
+            """Start refreshing the key and register it as in flight until it's done."""
+            task = asyncio.ensure_future(refresh(key, entry, *args, **kwargs))
+            _in_flight[key] = task
+            task.add_done_callback(lambda _: _in_flight.pop(key, None))
+            return task
+
+        def create_key(*args, **kwargs) -> str:
+            """Create the cache key for a call with the given arguments."""
+            return f"[RESULT] {func.__name__} ({args}, {kwargs})"
+
+        def get_freshness(value: Any) -> timedelta:
+            """Return for how long the cached value is fresh."""
+            return freshness(value) if callable(freshness) else freshness
+
+        async def get_entry(*args, **kwargs) -> Optional[LocalCacheEntry]:
+            """Return the cached entry for a call with the given arguments, if there is one."""
+            return await _load(create_key(*args, **kwargs), load_transform)
+
+        async def force_refresh(*args, **kwargs):
+            """Refresh the cached result for a call with the given arguments, even if it's fresh."""
+            key = create_key(*args, **kwargs)
+            task = _in_flight.get(key)
+            if task is None:
+                entry = await get_entry(*args, **kwargs)
+                # Another caller may have started a refresh while the entry was loaded.
+                task = _in_flight.get(key) or start_refresh(key, entry, *args, **kwargs)
+            return await asyncio.shield(task)
 
         async def wrapper(*args, **kwargs):
-            key = f"[RESULT] {func.__name__} ({args}, {kwargs})"
+            key = create_key(*args, **kwargs)
             logger.info("Checking cache for '%s'", key)
             # Check if this method call has been cached.
-            entry = cache.get(key)
+            with span("cache_get"):
+                entry = await _load(key, load_transform)
             if entry:
                 # Calculate how long this entry has been stored.
                 entry_age = datetime.now(timezone.utc) - entry.timestamp
@@ -98,36 +496,74 @@ def cache_this(store_transform=(lambda x: x), load_transform=(lambda x: x)):
                 )
 
                 # Check if the cache entry is still fresh.
-                if freshness >= entry_age:
+                if get_freshness(entry.value) >= entry_age:
                     # If it is, return the stored result.
                     logger.info("Cache entry is fresh for '%s'; returning it.", key)
-                    return load_transform(entry.data)
+                    lookups["fresh"] += 1
+                    return entry.value
+
+                # Check if the cache entry can still be used while it's refreshed.
+                if max_stale is not None and max_stale >= entry_age:
+                    if key not in _in_flight and not can_refresh():
+                        logger.info(
+                            "Cache entry is stale for '%s'; not refreshing it for now.",
+                            key,
+                        )
+                    elif key not in _in_flight:
+                        logger.info(
+                            "Cache entry is stale for '%s'; refreshing it in the background.",
+                            key,
+                        )
+                        task = start_refresh(key, entry, *args, **kwargs)
+                        task.add_done_callback(
+                            lambda t: _log_background_refresh(key, t, expected_errors)
+                        )
+                    logger.info("Returning non-fresh cache entry for '%s'", key)
+                    lookups["stale"] += 1
+                    return entry.value
+
+            # If there is no usable cache entry, call the function to get a new result.
+            # Concurrent callers for the same key wait for a single refresh instead of starting their own.
+            lookups["miss"] += 1
+            task = _in_flight.get(key)
+            if task is None:
+                logger.info(
+                    "No fresh cache entry for '%s'; calling original function.", key
+                )
+                task = start_refresh(key, entry, *args, **kwargs)
+            else:
+                logger.info(
+                    "No fresh cache entry for '%s'; waiting for ongoing refresh.", key
+                )
+                coalesced_calls["local"] += 1
 
-            # If there is no fresh cache entry, call the function to get a new result.
-            logger.info(
-                "No fresh cache entry for '%s'; calling original function.", key
-            )
             try:
-                new_result = await func(*args, **kwargs)
+                # Shield the refresh so a cancelled caller doesn't cancel it for everyone else.
+                return await asyncio.shield(task)
 
             except Exception as e:
-                logger.exception("Error calling original function ('%s'): %s", key, e)
-
                 if entry:
-                    logger.info("Returning non-fresh cache entry for '%s'", key)
-                    return entry.data
+                    # Expected while the source is down, so skip the traceback.
+                    logger.warning(
+                        "Error calling original function ('%s'): %r; returning non-fresh cache entry.",
+                        key,
+                        e,
+                    )
+                    return entry.value
 
                 else:
+                    logger.exception(
+                        "Error calling original function ('%s'): %s", key, e
+                    )
                     logger.error(
                         "No entry exists for '%s', passing exception along.", key
                     )
                     raise e
 
-            # Cache the new result and return it.
-            cache.set(key, store_transform(new_result))
-            logger.info("Updated cache with new results for '%s'.", key)
-            return new_result
-
+        # Allow callers (e.g., the cache warmer) to inspect and refresh entries proactively.
+        wrapper.get_freshness = get_freshness
+        wrapper.get_entry = get_entry
+        wrapper.refresh = force_refresh
         return wrapper
 
     return cache_decorator
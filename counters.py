@@ -1,13 +1,34 @@
+import asyncio
 import logging
+from collections import Counter
 from functools import wraps
 from os import getenv
-from typing import Any, Callable, Dict
+from time import monotonic
+from typing import Any, Callable, Dict, Optional
 
 # Use the redis cache to hold the counts.
 from cache import cache
+from metrics import span
 
 logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
 
+# Counts are kept in memory and written to redis in batches: every FLUSH_INTERVAL seconds,
+# or as soon as MAX_PENDING counted calls are waiting, whichever comes first.
+# MAX_PENDING also bounds how many calls go uncounted if the process dies before flushing.
+# With a FLUSH_INTERVAL of 0 (or less), every call is written right away.
+FLUSH_INTERVAL = float(getenv("COUNTER_FLUSH_INTERVAL", "10"))
+MAX_PENDING = int(getenv("COUNTER_MAX_PENDING", "500"))
+# After a failed flush, wait before trying again (twice as long after each failure in a row).
+MAX_FLUSH_BACKOFF = float(getenv("COUNTER_MAX_FLUSH_BACKOFF", "300"))
+
+# Increments that haven't been written to redis yet.
+_pending_counts: Counter = Counter()
+# The flush that's running, if any; only one runs at a time.
+_flush_task: Optional["asyncio.Task[None]"] = None
+# Failed flushes in a row, and when (in monotonic time) the next one can start.
+_failed_flushes = 0
+_next_flush_at = 0.0
+
 
 def create_counter_key(func_name: str, *args, **kwargs) -> str:
     """Create cache keys based on the main methods that will be counted."""
@@ -15,30 +36,103 @@ def create_counter_key(func_name: str, *args, **kwargs) -> str:
         "get_calendar": f"{kwargs['team'].name}-{kwargs['calendar_type'].name}-CAL",
         "get_next_game": f"{kwargs['team'].name}-{kwargs['calendar_type'].name}-NEXT",
         "get_last_game": f"{kwargs['team'].name}-{kwargs['calendar_type'].name}-LAST",
+        # Calendars of past seasons are counted with the others.
+        "get_season_calendar": f"{kwargs['team'].name}-{kwargs['calendar_type'].name}-CAL",
     }.get(func_name, f"{func_name} ({args}, {kwargs})")
 
 
+async def _flush() -> None:
+    """Write all pending counts to redis in a single batch."""
+    global _failed_flushes, _next_flush_at
+    if not _pending_counts:
+        return
+    batch = dict(_pending_counts)
+    _pending_counts.clear()
+    try:
+        await cache.set_fields_incr("request_counts", batch)
+        logger.info("Flushed %d pending counters.", len(batch))
+        _failed_flushes = 0
+    except Exception as e:
+        # Put the counts back so they're retried with a later flush.
+        _pending_counts.update(batch)
+        _failed_flushes += 1
+        backoff = min(
+            MAX_FLUSH_BACKOFF, max(FLUSH_INTERVAL, 1) * 2 ** (_failed_flushes - 1)
+        )
+        _next_flush_at = monotonic() + backoff
+        logger.warning(
+            "Error flushing counters (%d failure(s) in a row): %r; retrying in %.0fs.",
+            _failed_flushes,
+            e,
+            backoff,
+        )
+
+
+def _can_flush() -> bool:
+    """Check if a flush can start: none is running, and the last one didn't just fail."""
+    return (_flush_task is None or _flush_task.done()) and monotonic() >= _next_flush_at
+
+
+def _start_flush() -> "asyncio.Task[None]":
+    """Start flushing in the background (the module keeps a reference to the task)."""
+    global _flush_task
+    _flush_task = asyncio.create_task(_flush())
+    return _flush_task
+
+
+async def flush_counts() -> None:
+    """Wait for the running flush (if any), then write whatever counts are still pending."""
+    if _flush_task is not None and not _flush_task.done():
+        await asyncio.shield(_flush_task)
+    await _start_flush()
+
+
+async def run_counter_flusher() -> None:
+    """Flush pending counts periodically; meant to run in the background for the app's lifetime."""
+    while True:
+        # Without an interval, counts are written as they're counted; this only retries
+        # counts left pending by failed flushes, so it doesn't need to spin.
+        await asyncio.sleep(max(FLUSH_INTERVAL, 1))
+        if _can_flush():
+            # Don't cancel the flush itself if the flusher is cancelled while it runs.
+            await asyncio.shield(_start_flush())
+
+
 def count_this(func) -> Callable[[Any], Any]:
     """Decorator to count how many times a method is called."""
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        logger.info("Counting call for '%s'", f"{func.__name__} ({args}, {kwargs})")
-        counter = create_counter_key(func.__name__, *args, **kwargs)
-        # Keeps counters for 3 categories of request:
-        #   1. request type (next/last/calendar) + calendar type (full/home/away) + team
-        #   2. calendar type (full/home/away) + team
-        #   3. team
-        # Since the number of teams is limited, the memory footprint is not significant
-        # compared to the speedup when creating the homepage of the application.
-        cache.set_field_incr(key="request_counts", field=counter)
-        cache.set_field_incr(key="request_counts", field=counter[: len("???-????")])
-        cache.set_field_incr(key="request_counts", field=counter[: len("???")])
+        # The arguments are only formatted if the message is actually logged.
+        logger.debug("Counting call for '%s' (%s, %s)", func.__name__, args, kwargs)
+        with span("count"):
+            counter = create_counter_key(func.__name__, *args, **kwargs)
+            # Keeps counters for 3 categories of request:
+            #   1. request type (next/last/calendar) + calendar type (full/home/away) + team
+            #   2. calendar type (full/home/away) + team
+            #   3. team
+            # Since the number of teams is limited, the memory footprint is not significant
+            # compared to the speedup when creating the homepage of the application.
+            _pending_counts[counter] += 1
+            _pending_counts[counter[: len("???-????")]] += 1
+            _pending_counts[counter[: len("???")]] += 1
+
+            # Don't let too many counts pile up in memory before writing them to redis;
+            # each call increases 3 counters. While redis is failing, flushes wait for the backoff.
+            if (
+                FLUSH_INTERVAL <= 0 or _pending_counts.total() >= 3 * MAX_PENDING
+            ) and _can_flush():
+                _start_flush()
+
         return await func(*args, **kwargs)
 
     return wrapper
 
 
-def get_team_calendar_counts() -> Dict[str, str]:
+async def get_team_calendar_counts() -> Dict[str, str]:
     """Retrieve the counts stored in the database; counts are strings due to redis implementation."""
-    return cache.get_set("request_counts")
+    counts = await cache.get_set("request_counts")
+    # Include the counts that haven't been written to redis yet.
+    for field, increment in _pending_counts.items():
+        counts[field] = str(int(counts.get(field, 0)) + increment)
+    return counts
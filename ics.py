@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from utils import Game
+
+# Properties are written in the same order, and with the same escaping and line folding,
+# as the icalendar package (v6.2.0) uses, so the output is byte-for-byte the same.
+LINE_LIMIT = 75
+FOLD_SEPARATOR = "\r\n "
+PRODID = "-//Puckdex//puckdex.cbdm.app//EN"
+UID_DOMAIN = "puckdex.cbdm.app"
+
+
+def escape_text(text: str) -> str:
+    """Escape a TEXT value (RFC 5545, section 3.3.11)."""
+    # NOTE: the order of the replacements matters.
+    return (
+        text.replace(r"\N", "\n")
+        .replace("\\", "\\\\")
+        .replace(";", r"\;")
+        .replace(",", r"\,")
+        .replace("\r\n", r"\n")
+        .replace("\n", r"\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    """Split a content line longer than 75 octets into multiple lines (RFC 5545, section 3.1)."""
+    if line.isascii():
+        # Fast path for the common case: every character is a single octet.
+        return FOLD_SEPARATOR.join(
+            line[i : i + LINE_LIMIT - 1] for i in range(0, len(line), LINE_LIMIT - 1)
+        )
+
+    if len(line.encode("utf-8")) < LINE_LIMIT:
+        return line
+
+    # Never split a multi-octet character between two lines.
+    folded = []
+    byte_count = 0
+    for char in line:
+        char_byte_len = len(char.encode("utf-8"))
+        byte_count += char_byte_len
+        if byte_count >= LINE_LIMIT:
+            folded.append(FOLD_SEPARATOR)
+            byte_count = char_byte_len
+        folded.append(char)
+    return "".join(folded)
+
+
+def format_datetime(dt: datetime) -> str:
+    """Format a date-time value in UTC (RFC 5545, section 3.3.5)."""
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def content_line(name: str, value: str) -> str:
+    """Create a complete content line (including its line break) for an already escaped value."""
+    return fold_line(f"{name}:{value}") + "\r\n"
+
+
+def game_uid(game: Game) -> str:
+    """Return the event UID for a game; it's the same in every calendar that includes the game."""
+    return f"{game.start.date()}_{game.home_team_abbrev}_{game.away_team_abbrev}@{UID_DOMAIN}"
+
+
+def game_event(game: Game, dtstamp: str) -> str:
+    """Create the VEVENT for a game."""
+    # Format game information.
+    home_team = game.home_team_name
+    home_score = f"({game.home_score}) " if game.ended else ""
+    away_team = game.away_team_name
+    away_score = f" ({game.away_score})" if game.ended else ""
+    game_info = f"{away_team}{away_score} @ {home_score}{home_team}"
+
+    # Format extra information
+    extra_info = ""
+    if game.where_to_watch:
+        extra_info += f"Where to watch: {', '.join(game.where_to_watch)}\n"
+
+    lines = [
+        "BEGIN:VEVENT\r\n",
+        content_line("SUMMARY", escape_text(game_info)),
+        content_line("DTSTART", format_datetime(game.start)),
+        content_line("DTEND", format_datetime(game.end)),
+        content_line("DTSTAMP", dtstamp),
+        content_line("UID", escape_text(game_uid(game))),
+    ]
+    # Optional properties are sorted by name.
+    if extra_info:
+        lines.append(content_line("DESCRIPTION", escape_text(extra_info.strip())))
+    if game.venue:
+        lines.append(content_line("LOCATION", escape_text(game.venue)))
+    lines.append("END:VEVENT\r\n")
+    return "".join(lines)
+
+
+def iter_calendar(
+    calname: str, games: Iterable[Game], dtstamp: datetime
+) -> Iterator[bytes]:
+    """Write an ics calendar with one event per game, one chunk at a time."""
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        + content_line("VERSION", "2.0")
+        + content_line("PRODID", escape_text(PRODID))
+        + content_line("METHOD", "PUBLISH")
+        + content_line("X-WR-CALNAME", escape_text(calname))
+        + content_line("X-WR-TIMEZONE", "UTC")
+    ).encode("utf-8")
+
+    formatted_dtstamp = format_datetime(dtstamp)
+    for game in games:
+        yield game_event(game, formatted_dtstamp).encode("utf-8")
+
+    yield b"END:VCALENDAR\r\n"
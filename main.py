@@ -1,75 +1,328 @@
+import asyncio
+import gzip
+import hashlib
+import heapq
 import json
 import logging
-from datetime import datetime, timezone
+import math
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from os import getenv
 from os.path import abspath, dirname, join
-from typing import Dict, List
-from zoneinfo import ZoneInfo
+from time import monotonic, perf_counter
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import requests
-from fastapi import FastAPI, HTTPException, Request, Response
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from icalendar import Calendar, Event
+from pydantic import BaseModel
 
-from cache import cache_this
-from counters import count_this, get_team_calendar_counts
+from archive import schedule_archive
+from cache import cache, cache_this
+from counters import (
+    count_this,
+    flush_counts,
+    get_team_calendar_counts,
+    run_counter_flusher,
+)
+from ics import game_uid, iter_calendar
+from metrics import render_metrics, request_durations, span, timed_iter
+from nhl_api import (
+    CircuitOpenError,
+    NHLAPIError,
+    fetch_schedule,
+    fetch_season_schedule,
+    is_available,
+    nhl_api,
+)
+from templating import get_templates
 from utils import (
     ABBREV_TO_NAME_MAP,
-    SCHEDULE_API_URL,
+    MAX_STALENESS,
     CalendarType,
     Game,
+    LRUCache,
     Schedule,
     TeamAbbrev,
+    env_flag,
+    game_store,
+    upcoming_games,
 )
 
-app = FastAPI()
+try:
+    import brotli
+except ImportError:
+    # Pages are only precompressed with gzip without brotli.
+    brotli = None
+
+# Run the cache warmer in the background of the app. It's off by default because every worker
+# would run its own warmer, starting with a pass over all teams; deployments should instead run
+# a single `python warmer.py --loop` next to the app (or `python warmer.py` from a cron job).
+WARMER_ENABLED = env_flag("WARMER_ENABLED", False)
+
+# How long (in seconds) the rendered landing page is reused (and cached by clients);
+# the request counts it shows are at most this old.
+HOMEPAGE_TTL = int(getenv("HOMEPAGE_TTL", "60"))
+# How long (in seconds) clients can cache pages and files that only change with a new deployment.
+ABOUT_MAX_AGE = int(getenv("ABOUT_MAX_AGE", "86400"))
+STATIC_MAX_AGE = int(getenv("STATIC_MAX_AGE", "604800"))
+# Where the site is served (e.g., https://puckdex.cbdm.app). If it's set, pages link to it and are
+# the same for every request; otherwise they link to the URL each request was sent to.
+SITE_URL = getenv("SITE_URL", "").rstrip("/")
+# Pages are compressed once per render, but on the event loop, so keep brotli fast.
+BROTLI_QUALITY = int(getenv("BROTLI_QUALITY", "5"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up and tear down resources shared by all requests."""
+    # Write request counts to redis in the background.
+    counter_flusher = asyncio.create_task(run_counter_flusher())
+
+    # Keep schedules fresh in the background so requests don't wait on the NHL API.
+    cache_warmer = None
+    if WARMER_ENABLED:
+        # Imported here because the warmer itself uses the functions defined in this module.
+        from warmer import run_warmer
+
+        cache_warmer = asyncio.create_task(run_warmer())
+
+    yield
+
+    if cache_warmer is not None:
+        cache_warmer.cancel()
+        with suppress(asyncio.CancelledError):
+            await cache_warmer
+
+    # Stop the background flushes and write whatever counts are still pending.
+    counter_flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await counter_flusher
+    await flush_counts()
+
+    # Close the pooled connections to the NHL API and redis.
+    await nhl_api.aclose()
+    await cache.aclose()
 
-# Use the absolute path for the templates and static folder so the webserver can find it.
-templates = Jinja2Templates(directory=join(dirname(abspath(__file__)), "templates"))
+
+app = FastAPI(lifespan=lifespan)
+
+
+class CachedStaticFiles(StaticFiles):
+    """Serves static files that clients can keep without checking for changes."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = (
+            f"public, max-age={STATIC_MAX_AGE}, immutable"
+        )
+        return response
+
+
+# Use the absolute path for the static folder so the webserver can find it.
 app.mount(
     "/static",
-    StaticFiles(directory=join(dirname(abspath(__file__)), "static")),
+    CachedStaticFiles(directory=join(dirname(abspath(__file__)), "static")),
     name="static",
 )
 # Create a logger to help debug future issues.
 logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
 
 
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    """Record how long each route takes to respond."""
+    start = perf_counter()
+    response = await call_next(request)
+    # Label by the route's path template (e.g., /{calendar_type}/{team}.ics) to keep the labels few.
+    route = request.scope.get("route")
+    request_durations.observe(
+        perf_counter() - start, route.path if route is not None else "unmatched"
+    )
+    return response
+
+
+class RenderedPage(BaseModel):
+    """Holds an HTML page rendered from a template, in each encoding it can be sent with."""
+
+    rendered_at: float
+    last_modified: datetime
+    etag: str
+    encodings: Dict[str, bytes]
+
+
+# Rendered pages for the most recently used templates and site URLs. Without SITE_URL, each
+# base URL (host, scheme) has its own pages; keeping only a few bounds what clients sending
+# many different Host headers can take.
+PAGE_CACHE_SIZE = int(getenv("PAGE_CACHE_SIZE", "8"))
+_rendered_pages: "LRUCache[Tuple[str, str], RenderedPage]" = LRUCache(PAGE_CACHE_SIZE)
+# One render of each template at a time; the others wait for it instead of rendering it again.
+_page_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _render_page(name: str, context: Dict[str, Any], site_url: str) -> RenderedPage:
+    """Render the template and compress the result, so it's done once for many requests."""
+    logger.info("Rendering page %s for %s", name, site_url)
+
+    def url_for(route: str, **path_params: Any) -> str:
+        return f"{site_url}{app.url_path_for(route, **path_params)}"
+
+    html = (
+        get_templates()
+        .get_template(name)
+        .render({**context, "url_for": url_for})
+        .encode("utf-8")
+    )
+    encodings = {"identity": html, "gzip": gzip.compress(html)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(html, quality=BROTLI_QUALITY)
+    return RenderedPage(
+        rendered_at=monotonic(),
+        last_modified=datetime.now(timezone.utc),
+        etag=_create_etag(name, hashlib.sha256(html).hexdigest()),
+        encodings=encodings,
+    )
+
+
+def _choose_encoding(request: Request, page: RenderedPage) -> str:
+    """Return the smallest encoding of the page that the client accepts."""
+    accepted = set()
+    for value in request.headers.get("accept-encoding", "").split(","):
+        encoding, _, params = value.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=") or 1)
+        except ValueError:
+            quality = 1
+        # Encodings with a quality of 0 are explicitly not accepted.
+        if quality > 0:
+            accepted.add(encoding.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in page.encodings and encoding in accepted:
+            return encoding
+    return "identity"
+
+
+def _is_current(page: Optional[RenderedPage], ttl: Optional[float]) -> bool:
+    """Check if the rendered page exists and isn't older than ttl."""
+    return page is not None and (ttl is None or monotonic() - page.rendered_at <= ttl)
+
+
+async def _page_response(
+    request: Request,
+    name: str,
+    max_age: int,
+    ttl: Optional[float] = None,
+    create_context: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None,
+) -> Response:
+    """Return the page rendered from the template, rendering it again if it's older than ttl."""
+    site_url = SITE_URL or str(request.base_url).rstrip("/")
+    key = (name, site_url)
+    page = _rendered_pages.get(key)
+    if not _is_current(page, ttl):
+        async with _page_locks.setdefault(name, asyncio.Lock()):
+            page = _rendered_pages.get(key)
+            if not _is_current(page, ttl):
+                context = await create_context() if create_context else {}
+                page = _render_page(name, context, site_url)
+                _rendered_pages.put(key, page)
+
+    # Each encoding is a different representation, so it needs its own ETag.
+    encoding = _choose_encoding(request, page)
+    etag = page.etag if encoding == "identity" else f'{page.etag[:-1]}-{encoding}"'
+    headers = _caching_headers(etag, page.last_modified, max_age)
+    headers["Vary"] = "Accept-Encoding"
+    if _is_not_modified(request, etag, page.last_modified):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=page.encodings[encoding], media_type="text/html", headers=headers
+    )
+
+
+async def _index_context() -> Dict[str, Any]:
+    """Return what the landing page shows."""
+    return {
+        "abbrev_map": ABBREV_TO_NAME_MAP,
+        "counts": await get_team_calendar_counts(),
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Landing page to show available calendars."""
-    return templates.TemplateResponse(
-        request=request,
-        name="index.html.j2",
-        context={
-            "abbrev_map": ABBREV_TO_NAME_MAP,
-            "counts": get_team_calendar_counts(),
-        },
+    # Reading the counts from redis and rendering the page is done at most once per HOMEPAGE_TTL.
+    return await _page_response(
+        request,
+        "index.html.j2",
+        max_age=HOMEPAGE_TTL,
+        ttl=HOMEPAGE_TTL,
+        create_context=_index_context,
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Timings and counts for this process, in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/about", response_class=HTMLResponse)
 async def about(request: Request):
     """Page with more information about the project and how to use it."""
-    return templates.TemplateResponse(request=request, name="about.html.j2")
+    # The page only changes with a new deployment.
+    return await _page_response(request, "about.html.j2", max_age=ABOUT_MAX_AGE)
 
 
-async def _fetch_schedule(team: TeamAbbrev) -> Dict:
-    """Fetch the team schedule from the NHL API and parse the JSON response into a dict."""
+async def _fetch_schedule(team: TeamAbbrev, season: Optional[int] = None) -> Dict:
+    """Fetch the team schedule (of the current season, by default) from the NHL API."""
     logger.info("Requesting schedule for %s from NHL API.", team.name)
-    response = requests.get(SCHEDULE_API_URL.format(team_abbrev=team.name), timeout=120)
-    if not response.status_code == 200:
+    try:
+        with span("fetch"):
+            if season is not None:
+                return await fetch_season_schedule(team.name, season)
+            return await fetch_schedule(team.name)
+    except CircuitOpenError as e:
+        # Tell clients when to try again instead of making them wait for requests that won't be sent.
         raise HTTPException(
-            status_code=404,
-            detail=f"Request to NHL API returned with a status of {response.status_code}",
-        )
-    return json.loads(response.text)
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        ) from e
+    except NHLAPIError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
 
 
-async def _parse_schedule(team: TeamAbbrev, data: Dict) -> Schedule:
-    """Parse the schedule information from the NHL API JSON response."""
+async def _parse_schedule(
+    team: TeamAbbrev,
+    data: Dict,
+    previous: Optional[Schedule] = None,
+    season: Optional[int] = None,
+) -> Schedule:
+    """Parse the schedule information from the NHL API JSON response.
+
+    If the previous version of the schedule is given, only the games that changed are updated.
+    The season defaults to the current one; responses for past seasons still report it.
+    """
     logger.info("Parsing NHL response to create schedule for %s", team.name)
 
     games: List[Game] = []
@@ -90,9 +343,11 @@ async def _parse_schedule(team: TeamAbbrev, data: Dict) -> Schedule:
         # Check if the game is over.
         is_over = game["gameState"] in {"FINAL", "OFF"}
 
-        # Create a new game instance.
+        # Reuse the game instance from the store (e.g., created for the opponent's schedule)
+        # if nothing changed; otherwise, create a new one.
         games.append(
-            Game(
+            game_store.get_or_create(
+                game_id=game.get("id", 0),
                 home_team_abbrev=home_team_abbrev,
                 home_team_name=home_team_name,
                 away_team_abbrev=away_team_abbrev,
@@ -102,7 +357,8 @@ async def _parse_schedule(team: TeamAbbrev, data: Dict) -> Schedule:
                 home_score=game["homeTeam"]["score"] if is_over else 0,
                 away_score=game["awayTeam"]["score"] if is_over else 0,
                 venue=game.get("venue", {}).get("default", ""),
-                where_to_watch=list(
+                # Sorted, so the same broadcasts always compare (and render) the same.
+                where_to_watch=sorted(
                     {
                         f"[{b['countryCode']}] {b['network']}"
                         for b in game.get("tvBroadcasts", [])
@@ -111,137 +367,681 @@ async def _parse_schedule(team: TeamAbbrev, data: Dict) -> Schedule:
             )
         )
 
+    timestamp = datetime.now(timezone.utc).isoformat()
+    if season is None:
+        season = data["currentSeason"]
+    if previous is not None and previous.team == team:
+        schedule = previous.updated_with(season, games, timestamp)
+        logger.info(
+            "Schedule for %s is at version %d (was %d)",
+            team.name,
+            schedule.version,
+            previous.version,
+        )
+        return schedule
+
     return Schedule(
         team=team,
-        season=data["currentSeason"],
+        season=season,
         games=games,
-        timestamp=datetime.now(timezone.utc).isoformat(),
+        timestamp=timestamp,
     )
 
 
+# How long (in seconds) games stay in redis after a schedule that has them was last stored.
+CACHE_GAME_TTL = int(getenv("CACHE_GAME_TTL", str(30 * 24 * 60 * 60)))
+
+
+def _game_key(game: Game) -> str:
+    """Return the key that holds this version of the game in redis."""
+    # Keys include the game's digest, so updating a game for one team never changes what
+    # an entry that was stored earlier for the other team refers to.
+    return f"[GAME] {game.game_id} {game.digest}"
+
+
+async def _dump_schedule(schedule: Schedule) -> Dict:
+    """Store the schedule's games by ID and convert the schedule into plain data that refers to them."""
+    # Both teams' schedules refer to the same key for a game, so each game is stored once.
+    games = {
+        _game_key(game): game.model_dump_json()
+        for game in schedule.games
+        if game.game_id
+    }
+    # Games are written first (refreshing their expiration) so the entry never refers to missing ones.
+    await cache.set_values(games, CACHE_GAME_TTL)
+    data = schedule.model_dump(mode="json", exclude={"games"})
+    data["games"] = [
+        _game_key(game) if game.game_id else game.model_dump(mode="json")
+        for game in schedule.games
+    ]
+    return data
+
+
+async def _load_schedule(data: Any) -> Optional[Schedule]:
+    """Load a cached schedule, reading the games it refers to with a single request.
+
+    Older entries hold the games themselves, or the whole schedule as a JSON string.
+    Returns None if any of the games has expired from redis.
+    """
+    if isinstance(data, str):
+        return Schedule.model_validate_json(data)
+
+    games: Dict[str, Game] = {}
+    missing = []
+    for key in data["games"]:
+        if not isinstance(key, str):
+            continue
+        # Games held by schedules in this process don't need to be read again.
+        _, game_id, digest = key.split(" ")
+        game = game_store.get(int(game_id))
+        if game is not None and game.digest == digest:
+            games[key] = game
+        else:
+            missing.append(key)
+    if missing:
+        for key, value in zip(missing, await cache.get_values(missing)):
+            if value is None:
+                logger.warning("Game '%s' is no longer cached.", key)
+                return None
+            games[key] = Game.model_validate_json(value)
+
+    return Schedule.model_validate(
+        {
+            **data,
+            "games": [
+                games[game] if isinstance(game, str) else game for game in data["games"]
+            ],
+        }
+    )
+
+
+def _schedule_freshness(schedule: Schedule) -> timedelta:
+    """Return for how long the schedule is fresh from when it was fetched."""
+    return schedule.update_freq(datetime.now(timezone.utc))
+
+
+def _fresh_until(schedule: Schedule) -> datetime:
+    """Return when the schedule stops being fresh."""
+    return datetime.fromisoformat(schedule.timestamp) + _schedule_freshness(schedule)
+
+
 # Cache created schedules so we don't have to fetch and parse data from the NHL API for each request.
 @cache_this(
-    store_transform=Schedule.model_dump_json,
-    load_transform=Schedule.model_validate_json,
+    store_transform=_dump_schedule,
+    load_transform=_load_schedule,
+    freshness=_schedule_freshness,
+    max_stale=MAX_STALENESS,
+    # Stale schedules are served as they are while the NHL API is down.
+    can_refresh=is_available,
+    expected_errors=(HTTPException,),
 )
 async def _create_complete_schedule(team: TeamAbbrev) -> Schedule:
     """Create and return a Schedule with all data for the team."""
     api_json_response = await _fetch_schedule(team)
-    return await _parse_schedule(team, api_json_response)
-
-
-async def _filter_schedule(s: Schedule, cal_type: CalendarType) -> Schedule:
-    """Filter the given schedule to have only the games that match the calendar type."""
-    if cal_type == CalendarType.FULL:
-        # For complete schedule, no filtering needed.
-        return s
-
-    elif cal_type == CalendarType.HOME:
-        # Ignore non-home games for home-only calendars.
-        return Schedule(
-            team=s.team,
-            season=s.season,
-            timestamp=s.timestamp,
-            games=[g for g in s.games if g.home_team_abbrev == s.team],
+    # Update the cached schedule (if any) instead of starting over.
+    previous = await _create_complete_schedule.get_entry(team)
+    with span("parse"):
+        schedule = await _parse_schedule(
+            team, api_json_response, previous.value if previous is not None else None
+        )
+    upcoming_games.update(schedule)
+    return schedule
+
+
+def _render_calendar(
+    team: TeamAbbrev, cal_type: CalendarType, games: List[Game], dtstamp: datetime
+) -> Iterator[bytes]:
+    """Render the given games (already filtered for the calendar type) as an ics calendar, in chunks.
+
+    The DTSTAMP should be when the games last changed (i.e., the Last-Modified of the response),
+    so every process renders the same bytes for the same ETag.
+    """
+    logger.info("Rendering %s calendar for %s", cal_type.name, team.name)
+    calname = f"{ABBREV_TO_NAME_MAP.get(team.name, team.name)} - {cal_type.name} Calendar".title()
+    return timed_iter("render", iter_calendar(calname, games, dtstamp=dtstamp))
+
+
+class RenderedCalendar(BaseModel):
+    """Holds an ics calendar rendered from a specific version of a team's schedule."""
+
+    version: str
+    last_modified: datetime
+    etag: str
+    content: bytes
+    fresh_until: datetime
+
+
+# Rendered calendars for each team and calendar type.
+# Each entry remembers when the games it was rendered from last changed, so it is
+# replaced as soon as a refresh changes them; at most 32 teams x 3 types are kept.
+_rendered_calendars: Dict[Tuple[TeamAbbrev, CalendarType], RenderedCalendar] = {}
+
+
+def _create_etag(*parts: Any) -> str:
+    """Create a strong ETag from the given parts."""
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _cache_max_age(fresh_until: datetime) -> int:
+    """Return for how many seconds a response that is fresh until the given time can be cached."""
+    remaining = fresh_until - datetime.now(timezone.utc)
+    return max(0, int(remaining.total_seconds()))
+
+
+def _caching_headers(
+    etag: str, last_modified: datetime, max_age: int
+) -> Dict[str, str]:
+    """Create the headers that allow clients and CDNs to cache a response."""
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        ),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Check if the request's conditional headers show the client already has this version."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110, section 13.2.2).
+        candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return etag in candidates or "*" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            # Ignore invalid dates as if the header wasn't sent.
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates only have second precision.
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def _not_modified_response(
+    etag: str, last_modified: datetime, max_age: int
+) -> Response:
+    """Create an empty response telling the client to use the version it already has."""
+    return Response(
+        status_code=304, headers=_caching_headers(etag, last_modified, max_age)
+    )
+
+
+def _calendar_version(
+    team: TeamAbbrev, cal_type: CalendarType, schedule: Schedule
+) -> Tuple[datetime, str]:
+    """Return when the calendar last changed and its ETag, based on the schedule it's rendered from."""
+    updated_at = schedule.updated_at(cal_type)
+    return (
+        datetime.fromisoformat(updated_at),
+        _create_etag(team.name, cal_type.name, updated_at),
+    )
+
+
+def _reuse_rendered(
+    rendered_calendars: Dict[Any, RenderedCalendar],
+    key: Any,
+    version: str,
+    fresh_until: datetime,
+) -> Optional[RenderedCalendar]:
+    """Return the calendar kept for the key if it was rendered from this version, if there is one."""
+    rendered = rendered_calendars.get(key)
+    if rendered is None or rendered.version != version:
+        return None
+    # The schedules may have been refreshed without changing these games.
+    rendered.fresh_until = fresh_until
+    return rendered
+
+
+def _find_rendered_calendar(
+    team: TeamAbbrev, cal_type: CalendarType, schedule: Schedule
+) -> Optional[RenderedCalendar]:
+    """Return the calendar rendered from this version of the schedule, if there is one."""
+    rendered = _reuse_rendered(
+        _rendered_calendars,
+        (team, cal_type),
+        schedule.updated_at(cal_type),
+        _fresh_until(schedule),
+    )
+    if rendered is not None:
+        logger.info(
+            "Reusing %s calendar for %s rendered from schedule of %s",
+            cal_type.name,
+            team.name,
+            rendered.version,
         )
+    return rendered
+
+
+def _store_rendered_calendar(
+    team: TeamAbbrev, cal_type: CalendarType, schedule: Schedule, content: bytes
+) -> RenderedCalendar:
+    """Keep the calendar rendered from the schedule so it can be reused."""
+    last_modified, etag = _calendar_version(team, cal_type, schedule)
+    rendered = RenderedCalendar(
+        version=schedule.updated_at(cal_type),
+        last_modified=last_modified,
+        etag=etag,
+        content=content,
+        fresh_until=_fresh_until(schedule),
+    )
+    _rendered_calendars[(team, cal_type)] = rendered
+    return rendered
+
 
-    elif cal_type == CalendarType.AWAY:
-        # Ignore non-away games for away-only calendars.
-        return Schedule(
-            team=s.team,
-            season=s.season,
-            timestamp=s.timestamp,
-            games=[g for g in s.games if g.away_team_abbrev == s.team],
+async def _get_rendered_calendar(
+    team: TeamAbbrev, cal_type: CalendarType
+) -> RenderedCalendar:
+    """Return the team's calendar rendered from the current version of its schedule."""
+    schedule = await _create_complete_schedule(team)
+    rendered = _find_rendered_calendar(team, cal_type, schedule)
+    if rendered is None:
+        last_modified, _ = _calendar_version(team, cal_type, schedule)
+        content = b"".join(
+            _render_calendar(
+                team, cal_type, schedule.games_for(cal_type), last_modified
+            )
         )
+        rendered = _store_rendered_calendar(team, cal_type, schedule, content)
+    return rendered
+
 
-    else:
-        # Should not reach here: pydantic should stop any routes with an invalid value for cal_type.
-        raise HTTPException(404, f"Unknown calendar type: {cal_type}")
+async def _stream_calendar(
+    chunks: Iterator[bytes], keep: Callable[[bytes], Any]
+) -> AsyncIterator[bytes]:
+    """Send the calendar as it's rendered, and keep it once it's complete."""
+    sent: List[bytes] = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    keep(b"".join(sent))
 
 
-async def create_fresh_calendar(team: TeamAbbrev, cal_type: CalendarType) -> Response:
+async def create_fresh_calendar(
+    team: TeamAbbrev, cal_type: CalendarType, request: Optional[Request] = None
+) -> Response:
     """Create and return an ics calendar with the given team's schedule."""
     logger.info("Creating fresh %s calendar for %s", cal_type.name, team.name)
+    schedule = await _create_complete_schedule(team)
+    last_modified, etag = _calendar_version(team, cal_type, schedule)
+    max_age = _cache_max_age(_fresh_until(schedule))
 
-    # Create empty calendar with required properties.
-    cal = Calendar()
-    cal.add("prodid", "-//Puckdex//puckdex.cbdm.app//EN")
-    cal.add("version", "2.0")
-    cal.add("METHOD", "PUBLISH")
-    calname = f"{ABBREV_TO_NAME_MAP.get(team.name, team.name)} - {cal_type.name} Calendar".title()
-    cal.add("X-WR-CALNAME", calname)
-    cal.add("X-WR-TIMEZONE", "UTC")
+    # The version is known before rendering, so there's no need to render it for clients that have it.
+    if request is not None and _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, max_age)
 
-    # Get and filter team's schedule.
+    # Return the calendar in ics format.
+    headers = _caching_headers(etag, last_modified, max_age)
+    rendered = _find_rendered_calendar(team, cal_type, schedule)
+    if rendered is not None:
+        return Response(
+            content=rendered.content, media_type="text/calendar", headers=headers
+        )
+    return StreamingResponse(
+        _stream_calendar(
+            _render_calendar(
+                team, cal_type, schedule.games_for(cal_type), last_modified
+            ),
+            lambda content: _store_rendered_calendar(team, cal_type, schedule, content),
+        ),
+        media_type="text/calendar",
+        headers=headers,
+    )
+
+
+def _game_response(
+    request: Request,
+    game: Game,
+    schedule: Schedule,
+    valid_from: Optional[datetime],
+    valid_until: Optional[datetime],
+) -> Union[Game, Response]:
+    """Return the game or a 304 response if the client already has it.
+
+    The answer is valid from when the previous game ended until the current one ends.
+    """
+    last_modified = datetime.fromisoformat(schedule.updated_at(CalendarType.FULL))
+    if valid_from is not None:
+        # The answer also changed when the previous game ended, even if the schedule didn't.
+        last_modified = max(last_modified, valid_from)
+    etag = _create_etag(game.model_dump_json())
+    max_age = _cache_max_age(_fresh_until(schedule))
+    if valid_until is not None:
+        # The answer changes once the current game ends, even if the schedule doesn't.
+        seconds_left = (valid_until - datetime.now(timezone.utc)).total_seconds()
+        max_age = max(0, min(max_age, int(seconds_left)))
+
+    if _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, max_age)
+
+    return JSONResponse(
+        content=game.model_dump(mode="json"),
+        headers=_caching_headers(etag, last_modified, max_age),
+    )
+
+
+def _parse_teams(teams: str) -> Tuple[TeamAbbrev, ...]:
+    """Parse a comma-separated list of teams into a canonical (sorted, without repeats) tuple."""
+    try:
+        parsed = {TeamAbbrev(t.strip().upper()) for t in teams.split(",") if t.strip()}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Unknown team in '{teams}'") from e
+    if not parsed:
+        raise HTTPException(status_code=422, detail="No teams were given")
+    return tuple(sorted(parsed))
+
+
+def _merge_games(schedules: List[Schedule], cal_type: CalendarType) -> List[Game]:
+    """Merge the games (of the calendar type) from all schedules, sorted by start."""
+    # Games between two of the teams appear in both schedules; keep them once, by their event UID.
+    games: Dict[str, Game] = {}
+    with span("filter"):
+        for game in heapq.merge(
+            *(s.games_for(cal_type) for s in schedules), key=lambda g: g.start
+        ):
+            games.setdefault(game_uid(game), game)
+    return list(games.values())
+
+
+# Combined calendars for the most recently requested sets of teams.
+# Teams are kept in a canonical order, so the same set of teams always uses the same entry.
+COMBO_CACHE_SIZE = int(getenv("COMBO_CACHE_SIZE", "256"))
+ComboKey = Tuple[Tuple[TeamAbbrev, ...], CalendarType]
+_rendered_combos: "LRUCache[ComboKey, RenderedCalendar]" = LRUCache(COMBO_CACHE_SIZE)
+
+
+@app.get("/combo/{calendar_type}.ics", response_class=FileResponse)
+async def get_combo_calendar(
+    calendar_type: CalendarType,
+    request: Request,
+    teams: str = Query(description="Comma-separated team abbreviations, e.g. BOS,TOR"),
+) -> Response:
+    """Return a single .ics calendar with the games of all the given teams in the current NHL season."""
+    combo = _parse_teams(teams)
+    logger.info("Received request of %s for %s", calendar_type, combo)
+
+    # Get all schedules; the combined calendar changes whenever the games of any of them change.
+    schedules = await asyncio.gather(*(_create_complete_schedule(t) for t in combo))
+    version = "|".join(s.updated_at(calendar_type) for s in schedules)
+    last_modified = max(
+        datetime.fromisoformat(s.updated_at(calendar_type)) for s in schedules
+    )
+    etag = _create_etag(",".join(t.name for t in combo), calendar_type.name, version)
+    fresh_until = min(_fresh_until(s) for s in schedules)
+    max_age = _cache_max_age(fresh_until)
+    if _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, max_age)
+
+    headers = _caching_headers(etag, last_modified, max_age)
+    key = (combo, calendar_type)
+    rendered = _reuse_rendered(_rendered_combos, key, version, fresh_until)
+    if rendered is not None:
+        return Response(
+            content=rendered.content, media_type="text/calendar", headers=headers
+        )
+
+    calname = f"Puckdex ({', '.join(t.name for t in combo)}) - {calendar_type.name.title()} Calendar"
+    return StreamingResponse(
+        _stream_calendar(
+            timed_iter(
+                "render",
+                iter_calendar(
+                    calname,
+                    _merge_games(schedules, calendar_type),
+                    dtstamp=last_modified,
+                ),
+            ),
+            lambda content: _rendered_combos.put(
+                key,
+                RenderedCalendar(
+                    version=version,
+                    last_modified=last_modified,
+                    etag=etag,
+                    content=content,
+                    fresh_until=fresh_until,
+                ),
+            ),
+        ),
+        media_type="text/calendar",
+        headers=headers,
+    )
+
+
+# Calendars limited to a window of days around today, for the most recently requested windows.
+# Windows are aligned to whole (UTC) days, so each one can be reused for the rest of the day.
+WINDOW_CACHE_SIZE = int(getenv("WINDOW_CACHE_SIZE", "256"))
+WindowKey = Tuple[TeamAbbrev, CalendarType, Optional[int], Optional[int]]
+_rendered_windows: "LRUCache[WindowKey, RenderedCalendar]" = LRUCache(WINDOW_CACHE_SIZE)
+
+
+async def create_windowed_calendar(
+    team: TeamAbbrev,
+    cal_type: CalendarType,
+    past_days: Optional[int],
+    future_days: Optional[int],
+    request: Request,
+) -> Response:
+    """Create an ics calendar with the team's games from past_days ago to future_days from today."""
+    logger.info(
+        "Creating %s calendar for %s (%s days back, %s days ahead)",
+        cal_type.name,
+        team.name,
+        past_days,
+        future_days,
+    )
     schedule = await _create_complete_schedule(team)
-    filtered_schedule = await _filter_schedule(schedule, cal_type)
-
-    # Add one calendar event for each scheduled game.
-    dtstamp = datetime.now(tz=ZoneInfo("UTC"))
-    for game in filtered_schedule.games:
-        # Format game information.
-        home_team = game.home_team_name
-        home_score = f"({game.home_score}) " if game.ended else ""
-        away_team = game.away_team_name
-        away_score = f" ({game.away_score})" if game.ended else ""
-        game_info = f"{away_team}{away_score} @ {home_score}{home_team}"
-
-        # Format extra information
-        extra_info = ""
-        if game.where_to_watch:
-            extra_info += f"Where to watch: {', '.join(game.where_to_watch)}\n"
-
-        # Create calendar event.
-        event = Event()
-        start_dt = datetime.fromisoformat(game.start_utc_timestamp)
-        event.add("summary", game_info)
-        event.add("dtstamp", dtstamp)
-        event.add("dtstart", start_dt)
-        event.add("dtend", start_dt + game.length)
-        if game.venue:
-            event.add("location", game.venue)
-        if extra_info:
-            event.add("description", extra_info.strip())
-
-        local_uid = f"{start_dt.date()}_{game.home_team_abbrev}_{game.away_team_abbrev}"
-        event.add("uid", f"{local_uid}@puckdex.cbdm.app")
-
-        # Add event to calendar.
-        cal.add_component(event)
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    tomorrow = today + timedelta(days=1)
 
-    # Return the calendar in ics format.
-    return Response(content=cal.to_ical().decode("utf-8"), media_type="text/calendar")
+    # The window moves every day, even if the schedule doesn't change.
+    version = f"{schedule.updated_at(cal_type)}|{today.date()}"
+    last_modified = max(datetime.fromisoformat(schedule.updated_at(cal_type)), today)
+    etag = _create_etag(team.name, cal_type.name, past_days, future_days, version)
+    fresh_until = min(_fresh_until(schedule), tomorrow)
+    max_age = _cache_max_age(fresh_until)
+    if _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, max_age)
+
+    headers = _caching_headers(etag, last_modified, max_age)
+    key = (team, cal_type, past_days, future_days)
+    rendered = _reuse_rendered(_rendered_windows, key, version, fresh_until)
+    if rendered is not None:
+        return Response(
+            content=rendered.content, media_type="text/calendar", headers=headers
+        )
+
+    with span("filter"):
+        games = schedule.games_between(
+            cal_type,
+            today - timedelta(days=past_days) if past_days is not None else None,
+            tomorrow + timedelta(days=future_days) if future_days is not None else None,
+        )
+    return StreamingResponse(
+        _stream_calendar(
+            _render_calendar(team, cal_type, games, last_modified),
+            lambda content: _rendered_windows.put(
+                key,
+                RenderedCalendar(
+                    version=version,
+                    last_modified=last_modified,
+                    etag=etag,
+                    content=content,
+                    fresh_until=fresh_until,
+                ),
+            ),
+        ),
+        media_type="text/calendar",
+        headers=headers,
+    )
 
 
 @app.get("/{calendar_type}/{team}.ics", response_class=FileResponse)
 @count_this
-async def get_calendar(calendar_type: CalendarType, team: TeamAbbrev) -> Response:
+async def get_calendar(
+    calendar_type: CalendarType,
+    team: TeamAbbrev,
+    request: Request,
+    past_days: Optional[int] = Query(
+        None, ge=0, le=366, description="Only include games from this many days ago"
+    ),
+    future_days: Optional[int] = Query(
+        None, ge=0, le=366, description="Only include games up to this many days ahead"
+    ),
+) -> Response:
     """Return an .ics calendar of the specified type and team in the current NHL season."""
     logger.info("Received request of %s for %s", calendar_type, team)
-    return await create_fresh_calendar(team, calendar_type)
 
+    # Calendars limited to fewer games are smaller and faster to render for frequent pollers.
+    if past_days is not None or future_days is not None:
+        return await create_windowed_calendar(
+            team, calendar_type, past_days, future_days, request
+        )
 
-@app.get("/next/{calendar_type}/{team}")
+    # Answer conditional requests for a still-fresh calendar without touching the schedule cache.
+    rendered = _rendered_calendars.get((team, calendar_type))
+    if rendered is not None:
+        max_age = _cache_max_age(rendered.fresh_until)
+        if max_age > 0 and _is_not_modified(
+            request, rendered.etag, rendered.last_modified
+        ):
+            logger.info("Calendar not modified for %s (%s)", team, rendered.etag)
+            return _not_modified_response(
+                rendered.etag, rendered.last_modified, max_age
+            )
+
+    return await create_fresh_calendar(team, calendar_type, request)
+
+
+# Calendars of past seasons never change, so clients and CDNs can keep them for long.
+ARCHIVE_MAX_AGE = int(getenv("ARCHIVE_MAX_AGE", "2592000"))
+# How long (in seconds) a season without games for a team is remembered, so it isn't fetched again.
+MISSING_SEASON_TTL = int(getenv("MISSING_SEASON_TTL", "86400"))
+MISSING_SEASON_CACHE_SIZE = int(getenv("MISSING_SEASON_CACHE_SIZE", "1024"))
+# Each team's season is only fetched once to be archived, even if it's requested concurrently.
+_archive_locks: Dict[Tuple[TeamAbbrev, int], asyncio.Lock] = {}
+# When each recently requested season without games stops being remembered.
+_missing_seasons: "LRUCache[Tuple[TeamAbbrev, int], float]" = LRUCache(
+    MISSING_SEASON_CACHE_SIZE
+)
+
+
+def _is_season(season: int) -> bool:
+    """Check if the number is a season in the NHL's format, e.g., 20232024."""
+    return 1917 <= season // 10000 <= 9998 and season % 10000 == season // 10000 + 1
+
+
+def _is_missing_season(team: TeamAbbrev, season: int) -> bool:
+    """Check if the team's season was recently found to have no games."""
+    expires_at = _missing_seasons.get((team, season))
+    if expires_at is None:
+        return False
+    if monotonic() < expires_at:
+        return True
+    del _missing_seasons[(team, season)]
+    return False
+
+
+def _missing_season_error(team: TeamAbbrev, season: int) -> HTTPException:
+    """Return the error for a season without games."""
+    return HTTPException(
+        status_code=404, detail=f"No games found for {team.name} in the {season} season"
+    )
+
+
+def _remember_missing_season(team: TeamAbbrev, season: int) -> HTTPException:
+    """Remember that the team's season has no games and return the error to answer with."""
+    _missing_seasons.put((team, season), monotonic() + MISSING_SEASON_TTL)
+    return _missing_season_error(team, season)
+
+
+async def _get_archived_schedule(team: TeamAbbrev, season: int) -> Schedule:
+    """Return the team's schedule for a past season, fetching and archiving it the first time."""
+    schedule = schedule_archive.load(team, season)
+    if schedule is not None:
+        return schedule
+    if _is_missing_season(team, season):
+        raise _missing_season_error(team, season)
+
+    lock = _archive_locks.setdefault((team, season), asyncio.Lock())
+    try:
+        async with lock:
+            schedule = schedule_archive.load(team, season)
+            if schedule is not None:
+                return schedule
+            if _is_missing_season(team, season):
+                raise _missing_season_error(team, season)
+
+            logger.info("Archiving the %d season of %s", season, team.name)
+            try:
+                data = await _fetch_schedule(team, season)
+            except HTTPException as e:
+                # Only the NHL API not knowing the season is remembered, not its outages.
+                if e.status_code == 404:
+                    _remember_missing_season(team, season)
+                raise
+            with span("parse"):
+                schedule = await _parse_schedule(team, data, season=season)
+            if not schedule.games:
+                # E.g., the team didn't exist yet; it's not archived, in case the NHL API adds them.
+                raise _remember_missing_season(team, season)
+            # Writing the file is blocking I/O, so don't block the event loop while it runs.
+            await asyncio.to_thread(schedule_archive.save, schedule)
+            return schedule
+    finally:
+        _archive_locks.pop((team, season), None)
+
+
+@app.get("/{season}/{calendar_type}/{team}.ics", response_class=FileResponse)
 @count_this
-async def get_next_game(calendar_type: CalendarType, team: TeamAbbrev) -> Game:
-    """Return information for the next game in the team's full/home/away calendar."""
-    logger.info("Received request for the next %s game for %s", calendar_type, team)
+async def get_season_calendar(
+    season: int, calendar_type: CalendarType, team: TeamAbbrev, request: Request
+) -> Response:
+    """Return an .ics calendar of the specified type and team in the given NHL season (e.g., 20232024)."""
+    logger.info(
+        "Received request of %s for %s in season %d", calendar_type, team, season
+    )
+    if not _is_season(season):
+        raise HTTPException(status_code=404, detail=f"Unknown season: {season}")
 
-    # Get and filter team's schedule.
-    schedule = await _create_complete_schedule(team)
-    filtered_schedule = await _filter_schedule(schedule, calendar_type)
+    # Archived seasons are complete, so serving them doesn't need the current schedule.
+    schedule = schedule_archive.load(team, season)
+    if schedule is None:
+        # The current season is served (and kept up to date) like the default calendars.
+        current = await _create_complete_schedule(team)
+        if season == current.season:
+            return await create_fresh_calendar(team, calendar_type, request)
+        if season > current.season:
+            raise HTTPException(
+                status_code=404, detail=f"The {season} season hasn't started yet"
+            )
+        schedule = await _get_archived_schedule(team, season)
 
-    # Parse through schedule and find the first game on a future date.
-    # IMPORTANT: This assumes the schedule is sorted!
-    #            As of 2025-03-16, the NHL API response is already sorted.
-    now = datetime.now(timezone.utc)
-    for game in filtered_schedule.games:
-        if (datetime.fromisoformat(game.start_utc_timestamp) + game.length) > now:
-            # Return the first game that ends on a future date.
-            return game
+    last_modified = datetime.fromisoformat(schedule.timestamp)
+    etag = _create_etag(team.name, calendar_type.name, season, schedule.timestamp)
+    if _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, ARCHIVE_MAX_AGE)
+    return Response(
+        content=b"".join(
+            _render_calendar(
+                team, calendar_type, schedule.games_for(calendar_type), last_modified
+            )
+        ),
+        media_type="text/calendar",
+        headers=_caching_headers(etag, last_modified, ARCHIVE_MAX_AGE),
+    )
 
-    # There are no games on a future date, we don't know when is the next one.
-    # Return a dummy Game object with TBD for opposing team.
+
+def _unknown_next_game(team: TeamAbbrev) -> Game:
+    """Return a dummy game, with TBD for the opposing team, for when there's no next game."""
     return Game(
         home_team_abbrev=team.name,
         home_team_name=ABBREV_TO_NAME_MAP[team.name],
@@ -251,17 +1051,9 @@ async def get_next_game(calendar_type: CalendarType, team: TeamAbbrev) -> Game:
     )
 
 
-@app.get("/last/{calendar_type}/{team}")
-@count_this
-async def get_last_game(calendar_type: CalendarType, team: TeamAbbrev) -> Game:
-    """Return information for the most recent game in the team's full/home/away calendar."""
-    logger.info("Received request for the last %s game for %s", calendar_type, team)
-    # Get and filter team's schedule.
-    schedule = await _create_complete_schedule(team)
-    filtered_schedule = await _filter_schedule(schedule, calendar_type)
-
-    # Create a dummy game in case we don't find a past game in the schedule.
-    last_game = Game(
+def _unknown_last_game(team: TeamAbbrev) -> Game:
+    """Return a dummy game for when there's no past game."""
+    return Game(
         home_team_abbrev=team.name,
         home_team_name=ABBREV_TO_NAME_MAP[team.name],
         away_team_abbrev="???",
@@ -269,16 +1061,132 @@ async def get_last_game(calendar_type: CalendarType, team: TeamAbbrev) -> Game:
         start_utc_timestamp="1970-01-01T00:00:00Z",
     )
 
-    # Parse through schedule and find the past game that ended the closest to current date.
-    # IMPORTANT: This assumes the schedule is sorted!
-    #            As of 2025-03-16, the NHL API response is already sorted.
+
+@app.get("/next/{calendar_type}/{team}")
+@count_this
+async def get_next_game(
+    calendar_type: CalendarType, team: TeamAbbrev, request: Request
+) -> Game:
+    """Return information for the next game in the team's full/home/away calendar."""
+    logger.info("Received request for the next %s game for %s", calendar_type, team)
+
+    # Get team's schedule and find the first game that ends on a future date.
+    schedule = await _create_complete_schedule(team)
+    now = datetime.now(timezone.utc)
+    with span("filter"):
+        game = schedule.next_game(calendar_type, now)
+        previous_game = schedule.last_game(calendar_type, now)
+    # The next game became the answer once the game before it ended.
+    valid_from = previous_game.end if previous_game is not None else None
+    if game is not None:
+        return _game_response(request, game, schedule, valid_from, game.end)
+
+    # There are no games on a future date, we don't know when is the next one.
+    return _game_response(
+        request, _unknown_next_game(team), schedule, valid_from, valid_until=None
+    )
+
+
+@app.get("/last/{calendar_type}/{team}")
+@count_this
+async def get_last_game(
+    calendar_type: CalendarType, team: TeamAbbrev, request: Request
+) -> Game:
+    """Return information for the most recent game in the team's full/home/away calendar."""
+    logger.info("Received request for the last %s game for %s", calendar_type, team)
+    # Get team's schedule and find the past game that ended the closest to current date.
+    schedule = await _create_complete_schedule(team)
     now = datetime.now(timezone.utc)
-    i = 0
-    while i < len(filtered_schedule.games) and now > (
-        datetime.fromisoformat(filtered_schedule.games[i].start_utc_timestamp)
-        + filtered_schedule.games[i].length
-    ):
-        last_game = filtered_schedule.games[i]
-        i += 1
-
-    return last_game
+    with span("filter"):
+        last_game = schedule.last_game(calendar_type, now)
+        following_game = schedule.next_game(calendar_type, now)
+    # The last game became the answer once it ended, and changes once the game following it ends.
+    valid_from = last_game.end if last_game is not None else None
+    valid_until = following_game.end if following_game is not None else None
+    if last_game is None:
+        # We didn't find a past game in the schedule.
+        last_game = _unknown_last_game(team)
+
+    return _game_response(request, last_game, schedule, valid_from, valid_until)
+
+
+async def _games_response(
+    request: Request, calendar_type: CalendarType, teams: Optional[str], last: bool
+) -> Response:
+    """Return the last or next game of each of the teams (all teams by default), by team."""
+    selected = _parse_teams(teams) if teams is not None else tuple(TeamAbbrev)
+    schedules = await asyncio.gather(*(_create_complete_schedule(t) for t in selected))
+    now = datetime.now(timezone.utc)
+
+    games: Dict[str, Any] = {}
+    # The answer changed when the latest of the last games ended and changes once the first
+    # of the next games ends, even if no schedule changes.
+    valid_from: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+    with span("filter"):
+        for schedule in schedules:
+            # Schedules may have been refreshed by another process and loaded from the cache.
+            upcoming_games.update(schedule)
+            last_game, next_game = upcoming_games.lookup(
+                schedule.team, calendar_type, now
+            )
+            game = last_game if last else next_game
+            if game is None:
+                unknown_game = _unknown_last_game if last else _unknown_next_game
+                game = unknown_game(schedule.team)
+            games[schedule.team.name] = game.model_dump(mode="json")
+            if last_game is not None and (
+                valid_from is None or last_game.end > valid_from
+            ):
+                valid_from = last_game.end
+            if next_game is not None and (
+                valid_until is None or next_game.end < valid_until
+            ):
+                valid_until = next_game.end
+
+    content = json.dumps(games, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+    last_modified = max(
+        datetime.fromisoformat(s.updated_at(CalendarType.FULL)) for s in schedules
+    )
+    if valid_from is not None:
+        last_modified = max(last_modified, valid_from)
+    etag = _create_etag(content)
+    fresh_until = min(_fresh_until(s) for s in schedules)
+    if valid_until is not None:
+        fresh_until = min(fresh_until, valid_until)
+    max_age = _cache_max_age(fresh_until)
+    if _is_not_modified(request, etag, last_modified):
+        return _not_modified_response(etag, last_modified, max_age)
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers=_caching_headers(etag, last_modified, max_age),
+    )
+
+
+@app.get("/next/{calendar_type}")
+async def get_next_games(
+    calendar_type: CalendarType,
+    request: Request,
+    teams: Optional[str] = Query(
+        None, description="Comma-separated team abbreviations; all teams by default"
+    ),
+) -> Dict[str, Game]:
+    """Return the next game in the full/home/away calendar of each of the teams."""
+    logger.info("Received request for the next %s games for %s", calendar_type, teams)
+    return await _games_response(request, calendar_type, teams, last=False)
+
+
+@app.get("/last/{calendar_type}")
+async def get_last_games(
+    calendar_type: CalendarType,
+    request: Request,
+    teams: Optional[str] = Query(
+        None, description="Comma-separated team abbreviations; all teams by default"
+    ),
+) -> Dict[str, Game]:
+    """Return the most recent game in the full/home/away calendar of each of the teams."""
+    logger.info("Received request for the last %s games for %s", calendar_type, teams)
+    return await _games_response(request, calendar_type, teams, last=True)
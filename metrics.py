@@ -0,0 +1,199 @@
+"""Collect timings and counts of what the app does, and export them in the Prometheus text format.
+
+Metrics are kept in memory for each process, so each worker reports its own.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar, Union
+
+from utils import env_flag
+
+# Skip the timing of spans (but keep counting) to shave off some overhead per request.
+METRICS_ENABLED = env_flag("METRICS_ENABLED", True)
+
+# Upper bounds (in seconds) of the histogram buckets; they go from cache hits to slow NHL API calls.
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+T = TypeVar("T")
+
+
+def _format_value(value: Union[int, float]) -> str:
+    """Format a sample value the way Prometheus expects it."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Counts observed values in buckets, separately for each value of its label."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label: str,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        # For each label value: the count of values in each bucket (plus one for +Inf), and their sum.
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Counter = Counter()
+
+    def observe(self, value: float, label_value: str) -> None:
+        """Record a value."""
+        counts = self._counts.get(label_value)
+        if counts is None:
+            counts = self._counts[label_value] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[label_value] += value
+
+    def render(self) -> List[str]:
+        """Return the lines that describe the histogram in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_value, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{self.label}="{label_value}",le="{_format_value(bound)}"}} {cumulative}'
+                )
+            lines.append(
+                f'{self.name}_sum{{{self.label}="{label_value}"}} {_format_value(self._sums[label_value])}'
+            )
+            lines.append(
+                f'{self.name}_count{{{self.label}="{label_value}"}} {cumulative}'
+            )
+        return lines
+
+
+class CounterFamily:
+    """Exports the counts of a collections.Counter, one sample for each of its keys."""
+
+    def __init__(
+        self, name: str, description: str, label: str, values: Counter
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.label = label
+        self.values = values
+
+    def render(self) -> List[str]:
+        """Return the lines that describe the counters in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        for label_value, count in sorted(self.values.items()):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {count}')
+        return lines
+
+
+class Gauge:
+    """Exports a value that can go up and down; it's read when the metrics are rendered."""
+
+    def __init__(
+        self, name: str, description: str, value: Callable[[], Union[int, float]]
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.value = value
+
+    def render(self) -> List[str]:
+        """Return the lines that describe the gauge in the Prometheus text format."""
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.value())}",
+        ]
+
+
+# All metrics exported by render_metrics, in order.
+_registry: List[Union[Histogram, CounterFamily, Gauge]] = []
+
+
+def register(metric: Union[Histogram, CounterFamily, Gauge]) -> None:
+    """Export the metric with all others."""
+    _registry.append(metric)
+
+
+def render_metrics() -> str:
+    """Return all metrics in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# How long each step of handling a request takes (e.g., fetch, parse, render).
+span_durations = Histogram(
+    "puckdex_span_duration_seconds",
+    "Time spent in each step of handling requests.",
+    label="span",
+)
+register(span_durations)
+
+# How long each route takes to respond.
+request_durations = Histogram(
+    "puckdex_request_duration_seconds",
+    "Time spent handling requests for each route.",
+    label="route",
+)
+register(request_durations)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the code in the with block as a step with the given name."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        span_durations.observe(perf_counter() - start, name)
+
+
+def timed_iter(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield the items, timing only how long it takes to produce them as a step with the given name."""
+    if not METRICS_ENABLED:
+        yield from items
+        return
+    iterator = iter(items)
+    elapsed = 0.0
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            elapsed += perf_counter() - start
+        yield item
+    span_durations.observe(elapsed, name)
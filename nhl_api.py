@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import random
+from collections import Counter
+from importlib.util import find_spec
+from os import getenv
+from time import monotonic
+from typing import TYPE_CHECKING, Dict, Optional
+
+from metrics import CounterFamily, Gauge, register
+from utils import SCHEDULE_API_URL, SEASON_SCHEDULE_API_URL
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
+
+# Limits for outbound requests to the NHL API.
+MAX_CONCURRENT_REQUESTS = int(getenv("NHL_API_MAX_CONCURRENT_REQUESTS", "4"))
+MAX_CONNECTIONS = int(getenv("NHL_API_MAX_CONNECTIONS", "8"))
+REQUEST_TIMEOUT = float(getenv("NHL_API_REQUEST_TIMEOUT", "15"))
+CONNECT_TIMEOUT = float(getenv("NHL_API_CONNECT_TIMEOUT", "5"))
+MAX_RETRIES = int(getenv("NHL_API_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(getenv("NHL_API_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(getenv("NHL_API_BACKOFF_MAX", "8"))
+# Requests per second (on average) and how many can be sent at once before being limited; 0 disables the limit.
+RATE_LIMIT = float(getenv("NHL_API_RATE_LIMIT", "5"))
+RATE_BURST = int(getenv("NHL_API_RATE_BURST", "10"))
+# Stop sending requests after this many failures in a row, and probe again after the timeout (in seconds).
+BREAKER_FAILURES = int(getenv("NHL_API_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(getenv("NHL_API_BREAKER_RESET_TIMEOUT", "30"))
+
+# Responses with these statuses are usually temporary, so they're worth retrying.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class NHLAPIError(Exception):
+    """Raised when the NHL API doesn't return a usable response."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(NHLAPIError):
+    """Raised instead of sending a request while the NHL API is considered down."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            f"NHL API is unavailable; not sending requests for {retry_after:.0f}s"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops requests to a failing service for a while, then lets a single request probe it.
+
+    - closed: requests are sent; `failures` failures in a row open the circuit;
+    - open: requests fail right away, until `reset_timeout` seconds have passed;
+    - half-open: one request (the probe) is sent; the circuit closes if it succeeds,
+      or opens again if it fails.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(self, failures: int, reset_timeout: float) -> None:
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failure_count = 0
+        self._opened_at = 0.0
+        # When the current probe was sent; a probe that never finishes (e.g., it was cancelled)
+        # doesn't block the next one for longer than the timeout.
+        self._probe_sent_at: Optional[float] = None
+
+    def retry_after(self) -> float:
+        """Return how many seconds are left until the circuit can be probed."""
+        return max(0.0, self._opened_at + self.reset_timeout - monotonic())
+
+    def is_open(self) -> bool:
+        """Check if requests are refused right now, without sending the probe."""
+        return self.state == self.OPEN and self.retry_after() > 0
+
+    def allow(self) -> bool:
+        """Check if a request can be sent now (and, if it's the probe, count it as sent)."""
+        if self.state == self.CLOSED:
+            return True
+        now = monotonic()
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_sent_at = None
+        if (
+            self._probe_sent_at is not None
+            and now - self._probe_sent_at < self.reset_timeout
+        ):
+            return False
+        self._probe_sent_at = now
+        return True
+
+    def record_success(self) -> None:
+        """Close the circuit, since the service responded."""
+        if self.state != self.CLOSED:
+            logger.info("NHL API responded again; closing the circuit.")
+        self.state = self.CLOSED
+        self._failure_count = 0
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit if there were too many or the probe failed."""
+        self._failure_count += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self._failure_count >= self.failures
+        ):
+            logger.warning(
+                "NHL API failed %d time(s) in a row; opening the circuit for %.0fs.",
+                self._failure_count,
+                self.reset_timeout,
+            )
+            self.state = self.OPEN
+            self._opened_at = monotonic()
+
+
+class TokenBucket:
+    """Limits requests to `rate` per second on average, allowing bursts of up to `burst` at once."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = monotonic()
+
+    async def acquire(self) -> None:
+        """Wait until a request can be sent."""
+        if self.rate <= 0:
+            return
+        while True:
+            now = monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            api_requests["rate_limited"] += 1
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Outcome of each request (or attempt) to the NHL API:
+#   - "success": it responded, even if with an error that isn't worth retrying (e.g., 404);
+#   - "failure": it timed out, couldn't connect, or responded with a temporary error;
+#   - "rejected": it wasn't sent because the circuit was open;
+#   - "rate_limited": it had to wait to be sent (counted once for each wait).
+api_requests: Counter = Counter()
+register(
+    CounterFamily(
+        "puckdex_nhl_api_requests_total",
+        "Requests to the NHL API, by outcome.",
+        label="outcome",
+        values=api_requests,
+    )
+)
+
+
+class NHLAPIClient:
+    """Manages a pooled, non-blocking connection to the NHL API."""
+
+    def __init__(self) -> None:
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_TIMEOUT)
+        self._rate_limit = TokenBucket(RATE_LIMIT, RATE_BURST)
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Return the shared client, creating it on first use."""
+        # Imported here because httpx is slow to import, and it isn't needed until the first request.
+        import httpx
+
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                # HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it.
+                http2=find_spec("h2") is not None,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+                headers={"User-Agent": "puckdex (+https://puckdex.cbdm.app)"},
+            )
+        return self._client
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Return how long to wait before the next attempt (exponential with full jitter)."""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+    async def get_json(self, url: str) -> Dict:
+        """Request the url and parse its JSON response, retrying temporary failures.
+
+        Raises CircuitOpenError right away (without waiting for retries) while the API is down.
+        """
+        import httpx
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                api_requests["rejected"] += 1
+                raise CircuitOpenError(self.breaker.retry_after())
+            await self._rate_limit.acquire()
+
+            try:
+                async with self._semaphore:
+                    response = await self._get_client().get(url)
+                if response.status_code == 200:
+                    api_requests["success"] += 1
+                    self.breaker.record_success()
+                    return response.json()
+                error = NHLAPIError(
+                    f"Request to NHL API returned with a status of {response.status_code}",
+                    status_code=response.status_code,
+                )
+                retry = response.status_code in RETRY_STATUS_CODES
+
+            except httpx.TransportError as e:
+                # Covers timeouts as well as connection errors.
+                error = NHLAPIError(f"Request to NHL API failed: {e!r}")
+                retry = True
+
+            # Only temporary errors mean the API is in trouble; others (e.g., 404) are about the request.
+            if retry:
+                api_requests["failure"] += 1
+                self.breaker.record_failure()
+            else:
+                api_requests["success"] += 1
+                self.breaker.record_success()
+
+            # Don't wait to retry once the circuit is open; the retry wouldn't be sent.
+            if (
+                not retry
+                or attempt >= MAX_RETRIES
+                or self.breaker.state == CircuitBreaker.OPEN
+            ):
+                raise error
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            logger.warning(
+                "%s; retrying in %.2fs (attempt %d of %d).",
+                error,
+                delay,
+                attempt,
+                MAX_RETRIES,
+            )
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """Close all pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Share one client (and its connection pool) for all requests to the NHL API.
+nhl_api: NHLAPIClient = NHLAPIClient()
+
+# Export the state of the circuit as a number.
+_CIRCUIT_STATES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+register(
+    Gauge(
+        "puckdex_nhl_api_circuit_state",
+        "State of the circuit breaker for the NHL API (0: closed, 1: half-open, 2: open).",
+        value=lambda: _CIRCUIT_STATES[nhl_api.breaker.state],
+    )
+)
+
+
+async def fetch_schedule(team_abbrev: str) -> Dict:
+    """Fetch the team schedule from the NHL API and parse the JSON response into a dict."""
+    return await nhl_api.get_json(SCHEDULE_API_URL.format(team_abbrev=team_abbrev))
+
+
+async def fetch_season_schedule(team_abbrev: str, season: int) -> Dict:
+    """Fetch the team schedule for a specific season from the NHL API."""
+    return await nhl_api.get_json(
+        SEASON_SCHEDULE_API_URL.format(team_abbrev=team_abbrev, season=season)
+    )
+
+
+def is_available() -> bool:
+    """Check if requests to the NHL API are being sent (i.e., the circuit isn't open)."""
+    return not nhl_api.breaker.is_open()
@@ -0,0 +1,71 @@
+"""Load the page templates, using versions precompiled to Python modules when they're up to date.
+
+Precompiling the templates (e.g., while building a deployment) saves a cold process from parsing
+them before serving its first page:
+
+    python templating.py
+"""
+
+from os import getenv, listdir
+from os.path import abspath, dirname, getmtime, isdir, join
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from fastapi.templating import Jinja2Templates
+
+# Use the absolute paths for the templates so the webserver can find them.
+TEMPLATES_DIR = join(dirname(abspath(__file__)), "templates")
+COMPILED_TEMPLATES_DIR = getenv(
+    "TEMPLATES_COMPILED_DIR", join(dirname(abspath(__file__)), "templates_compiled")
+)
+
+# Created on first use, so processes that never render a page don't load jinja at all.
+_templates: Optional["Jinja2Templates"] = None
+
+
+def _create_environment(loader: Any) -> Any:
+    """Create a jinja environment with the same options Jinja2Templates uses for a directory."""
+    import jinja2
+
+    return jinja2.Environment(loader=loader, autoescape=jinja2.select_autoescape())
+
+
+def _compiled_templates_are_current() -> bool:
+    """Check if the precompiled templates exist and are newer than all templates."""
+    if not isdir(COMPILED_TEMPLATES_DIR):
+        return False
+    compiled = [
+        join(COMPILED_TEMPLATES_DIR, f) for f in listdir(COMPILED_TEMPLATES_DIR)
+    ]
+    sources = [join(TEMPLATES_DIR, f) for f in listdir(TEMPLATES_DIR)]
+    return bool(compiled) and min(map(getmtime, compiled)) >= max(
+        map(getmtime, sources)
+    )
+
+
+def get_templates() -> "Jinja2Templates":
+    """Return the templates used to render pages."""
+    global _templates
+    if _templates is None:
+        import jinja2
+        from fastapi.templating import Jinja2Templates
+
+        if _compiled_templates_are_current():
+            loader = jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR)
+        else:
+            loader = jinja2.FileSystemLoader(TEMPLATES_DIR)
+        _templates = Jinja2Templates(env=_create_environment(loader))
+    return _templates
+
+
+def compile_templates() -> None:
+    """Compile all templates to Python modules in COMPILED_TEMPLATES_DIR."""
+    import jinja2
+
+    environment = _create_environment(jinja2.FileSystemLoader(TEMPLATES_DIR))
+    environment.compile_templates(COMPILED_TEMPLATES_DIR, zip=None)
+
+
+if __name__ == "__main__":
+    compile_templates()
+    print(f"Compiled templates to {COMPILED_TEMPLATES_DIR}")
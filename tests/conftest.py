@@ -0,0 +1,76 @@
+"""Shared setup for the tests: the app runs with an in-memory cache and without the NHL API."""
+
+import os
+import sys
+from os.path import abspath, dirname, join
+
+# Settings are read when the app's modules are imported, so set them first.
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("WARMER_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# The app's modules live at the root of the repository.
+ROOT_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import json  # noqa: E402
+from typing import Dict  # noqa: E402
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+import cache  # noqa: E402
+import nhl_api  # noqa: E402
+from backends import MemoryBackend  # noqa: E402
+from nhl_api import NHLAPIClient  # noqa: E402
+
+FIXTURES_DIR = join(dirname(abspath(__file__)), "fixtures")
+
+
+def load_fixture(name: str) -> Dict:
+    """Return the NHL API response saved in tests/fixtures."""
+    with open(join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def use_nhl_api(monkeypatch, handler) -> NHLAPIClient:
+    """Send all requests to the NHL API to the handler instead."""
+    client = NHLAPIClient()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(nhl_api, "nhl_api", client)
+    monkeypatch.setattr(nhl_api, "BACKOFF_BASE", 0)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    """Start every test with an empty cache."""
+    monkeypatch.setattr(cache.cache, "backend", MemoryBackend())
+    monkeypatch.setattr(
+        cache,
+        "local_cache",
+        cache.LocalCache(cache.local_cache.max_entries, cache.local_cache.ttl),
+    )
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-timing",
+        action="store_true",
+        help="also run the tests that check timing budgets (they depend on the machine)",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "timing: checks a timing budget; only runs with --run-timing"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-timing"):
+        return
+    skip_timing = pytest.mark.skip(reason="timing budgets only run with --run-timing")
+    for item in items:
+        if "timing" in item.keywords:
+            item.add_marker(skip_timing)
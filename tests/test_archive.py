@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from typing import List
+
+import httpx
+import pytest
+
+import main
+from archive import ScheduleArchive
+from tests.conftest import load_fixture, use_nhl_api
+from utils import LRUCache, TeamAbbrev
+
+SEASON = 20242025
+
+
+@pytest.fixture
+def schedule():
+    return asyncio.run(
+        main._parse_schedule(TeamAbbrev.BOS, load_fixture("BOS.json"), season=SEASON)
+    )
+
+
+def test_saved_schedules_are_loaded(tmp_path, schedule):
+    ScheduleArchive(str(tmp_path)).save(schedule)
+
+    loaded = ScheduleArchive(str(tmp_path)).load(TeamAbbrev.BOS, SEASON)
+
+    assert loaded == schedule
+
+
+@pytest.mark.parametrize("content", [b"", b"PDXA", b"not an archive at all"])
+def test_unusable_files_are_treated_as_missing(tmp_path, content):
+    archive = ScheduleArchive(str(tmp_path))
+    path = archive._path(TeamAbbrev.BOS, SEASON)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(content)
+
+    assert archive.load(TeamAbbrev.BOS, SEASON) is None
+
+
+@pytest.fixture
+def archive(monkeypatch, tmp_path):
+    archive = ScheduleArchive(str(tmp_path))
+    monkeypatch.setattr(main, "schedule_archive", archive)
+    monkeypatch.setattr(
+        main, "_missing_seasons", LRUCache(main.MISSING_SEASON_CACHE_SIZE)
+    )
+    return archive
+
+
+def _get_all(paths: List[str]) -> List[httpx.Response]:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as app:
+            return [await app.get(path) for path in paths]
+
+    return asyncio.run(run())
+
+
+def test_archived_seasons_are_served_without_the_nhl_api(
+    monkeypatch, archive, schedule
+):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(500)
+
+    use_nhl_api(monkeypatch, handler)
+    archive.save(schedule)
+
+    (response,) = _get_all([f"/{SEASON}/full/BOS.ics"])
+
+    assert response.status_code == 200
+    assert requests == []
+
+
+def test_seasons_without_games_are_only_fetched_once(monkeypatch, archive):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith("/now"):
+            return httpx.Response(200, json=load_fixture("BOS.json"))
+        return httpx.Response(200, json={"games": []})
+
+    use_nhl_api(monkeypatch, handler)
+
+    responses = _get_all([f"/{SEASON}/full/BOS.ics", f"/{SEASON}/home/BOS.ics"])
+
+    assert [r.status_code for r in responses] == [404, 404]
+    assert requests.count(f"/v1/club-schedule-season/BOS/{SEASON}") == 1
+    assert main._archive_locks == {}
+
+
+def test_seasons_are_served_when_the_archive_cant_be_written(
+    monkeypatch, tmp_path, caplog
+):
+    # A file where the archive's directory should be, so nothing can be written to it.
+    (tmp_path / "archive").write_bytes(b"")
+    monkeypatch.setattr(
+        main, "schedule_archive", ScheduleArchive(str(tmp_path / "archive"))
+    )
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json=load_fixture("BOS.json"))
+
+    use_nhl_api(monkeypatch, handler)
+
+    with caplog.at_level(logging.ERROR):
+        responses = _get_all([f"/{SEASON}/full/BOS.ics", f"/{SEASON}/home/BOS.ics"])
+
+    assert [r.status_code for r in responses] == [200, 200]
+    # The schedule is kept in memory instead.
+    assert requests.count(f"/v1/club-schedule-season/BOS/{SEASON}") == 1
+    assert "Couldn't archive" in caplog.text
@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import pytest
+
+import cache
+import main
+from backends import MemoryBackend, RedisBackend, UpstashBackend
+from benchmarks.fake_redis import FakeRedis
+
+
+def _redis_backend() -> RedisBackend:
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBackend(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.fixture(params=["memory", "redis", "upstash"])
+def backend(request):
+    return {
+        "memory": MemoryBackend,
+        "redis": _redis_backend,
+        "upstash": lambda: UpstashBackend(FakeRedis()),
+    }[request.param]()
+
+
+def test_backends_store_values(backend):
+    async def run():
+        await backend.set_many({"a": "1", "b": "2"})
+        assert await backend.get("a") == "1"
+        assert await backend.get_many(["a", "missing", "b"]) == ["1", None, "2"]
+        assert await backend.get_many([]) == []
+        assert sorted(await backend.scan_keys("*")) == ["a", "b"]
+        assert await backend.incr("count") == 1
+        await backend.set_many({"c": "3", "d": "4"}, ttl=60)
+        assert await backend.get_many(["c", "d"]) == ["3", "4"]
+
+    asyncio.run(run())
+
+
+def test_backends_hold_locks(backend):
+    async def run():
+        assert await backend.set_if_absent("lock", "token", 60)
+        assert not await backend.set_if_absent("lock", "other", 60)
+        # Only the holder of the lock can release it.
+        await backend.delete_if_equal("lock", "other")
+        assert await backend.get("lock") == "token"
+        await backend.delete_if_equal("lock", "token")
+        assert await backend.get("lock") is None
+
+    asyncio.run(run())
+
+
+def test_backends_count_in_hashes(backend):
+    async def run():
+        await backend.hincrby_many("counts", {"BOS": 2, "TOR": 1})
+        assert await backend.hincrby("counts", "BOS", 1) == 3
+        assert await backend.hgetall("counts") == {"BOS": "3", "TOR": "1"}
+
+    asyncio.run(run())
+
+
+class HangingBackend(MemoryBackend):
+    """Never answers reads, as if redis were stuck."""
+
+    def __init__(self, read_started: asyncio.Event) -> None:
+        super().__init__()
+        self.read_started = read_started
+
+    async def get(self, key):
+        self.read_started.set()
+        await asyncio.Event().wait()
+
+
+def test_other_routes_are_served_while_redis_hangs(monkeypatch):
+    async def run():
+        read_started = asyncio.Event()
+        monkeypatch.setattr(cache.cache, "backend", HangingBackend(read_started))
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as app:
+            calendar = asyncio.create_task(app.get("/full/BOS.ics"))
+            await asyncio.wait_for(read_started.wait(), timeout=5)
+
+            # The hanging read doesn't block the event loop, so other routes still respond.
+            about = await asyncio.wait_for(app.get("/about"), timeout=5)
+            assert about.status_code == 200
+            assert not calendar.done()
+            calendar.cancel()
+
+    asyncio.run(run())
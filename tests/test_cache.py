@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import cache
+import main
+from cache import cache_this
+from tests.conftest import load_fixture
+from utils import TeamAbbrev
+
+
+def test_stale_entries_are_only_refreshed_while_the_upstream_is_up(caplog):
+    calls = []
+    upstream_is_up = False
+
+    @cache_this(
+        freshness=timedelta(0),
+        max_stale=timedelta(hours=1),
+        can_refresh=lambda: upstream_is_up,
+        expected_errors=(ConnectionError,),
+    )
+    async def get_value():
+        calls.append(1)
+        if len(calls) > 1:
+            raise ConnectionError("upstream is down")
+        return "value"
+
+    async def run():
+        nonlocal upstream_is_up
+        assert await get_value() == "value"
+
+        # Stale entries are served without trying to refresh them.
+        assert await get_value() == "value"
+        assert len(calls) == 1
+
+        upstream_is_up = True
+        assert await get_value() == "value"
+        await asyncio.gather(*cache._in_flight.values(), return_exceptions=True)
+        assert len(calls) == 2
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(run())
+
+    (record,) = [r for r in caplog.records if "Background refresh" in r.message]
+    assert record.levelno == logging.WARNING
+    assert record.exc_info is None
+
+
+ENTRY = cache.CacheEntry(
+    timestamp=datetime(2025, 10, 7, 23, 30, 15, 123456, tzinfo=timezone.utc),
+    data={"team": "MTL", "games": [{"venue": "Centre Bell", "score": [4, 2]}]},
+)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_compact_entries_round_trip(compress):
+    raw = cache.CompactCodec(compress=compress).encode(ENTRY)
+
+    assert raw.startswith(cache.CompactCodec.PREFIX)
+    assert cache.decode_entry(raw) == ENTRY
+
+
+def test_compact_entries_fall_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(cache, "msgpack", None)
+    raw = cache.CompactCodec().encode(ENTRY)
+
+    version = b64decode(raw[len(cache.CompactCodec.PREFIX) :])[0]
+    assert version == cache.CompactCodec.JSON_VERSION
+    assert cache.decode_entry(raw) == ENTRY
+
+
+def test_baseline_entries_are_still_loaded():
+    schedule = asyncio.run(
+        main._parse_schedule(TeamAbbrev.BOS, load_fixture("BOS.json"))
+    )
+    # Entries stored before the compact format hold the schedule as a JSON string.
+    raw = json.dumps(
+        {"timestamp": schedule.timestamp, "data": schedule.model_dump_json()}
+    )
+
+    entry = cache.decode_entry(raw)
+    loaded = asyncio.run(main._load_schedule(entry.data))
+
+    assert loaded.games == schedule.games
+
+
+def test_unknown_format_versions_are_rejected():
+    raw = cache.CompactCodec.PREFIX + b64encode(bytes([9, 0]) + b"{}").decode()
+
+    with pytest.raises(ValueError):
+        cache.decode_entry(raw)
+
+
+def test_concurrent_misses_share_a_single_call():
+    calls = []
+    release = asyncio.Event()
+
+    @cache_this()
+    async def get_value():
+        calls.append(1)
+        await release.wait()
+        return "value"
+
+    async def run():
+        callers = [asyncio.create_task(get_value()) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*callers)
+
+    assert asyncio.run(run()) == ["value"] * 10
+    assert len(calls) == 1
+
+
+def test_cancelled_callers_dont_cancel_the_refresh():
+    calls = []
+    release = asyncio.Event()
+
+    @cache_this()
+    async def get_value():
+        calls.append(1)
+        await release.wait()
+        return "value"
+
+    async def run():
+        cancelled = asyncio.create_task(get_value())
+        waiting = asyncio.create_task(get_value())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await waiting
+
+    assert asyncio.run(run()) == "value"
+    assert len(calls) == 1
+
+
+def test_stale_entries_are_served_while_a_single_refresh_runs():
+    calls = []
+
+    @cache_this(freshness=timedelta(0), max_stale=timedelta(hours=1))
+    async def get_value():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return f"value {len(calls)}"
+
+    async def run():
+        assert await get_value() == "value 1"
+        stale = await asyncio.gather(*(get_value() for _ in range(10)))
+        await asyncio.gather(*cache._in_flight.values())
+        return stale
+
+    assert asyncio.run(run()) == ["value 1"] * 10
+    assert len(calls) == 2
+
+
+def test_refreshes_elsewhere_are_awaited_while_the_lock_is_held(monkeypatch):
+    monkeypatch.setattr(cache, "DISTRIBUTED_LOCK", True)
+    monkeypatch.setattr(cache, "LOCK_POLL_INTERVAL", 0.01)
+    calls = []
+
+    @cache_this()
+    async def get_value():
+        calls.append(1)
+        return "mine"
+
+    key = "[RESULT] get_value ((), {})"
+
+    async def run():
+        # Another process holds the lock and stores the entry a bit later.
+        assert await cache.cache.acquire_lock(f"[LOCK] {key}", "other", 60)
+        caller = asyncio.create_task(get_value())
+        await asyncio.sleep(0.03)
+        await cache.cache.set(key, "theirs")
+        return await caller
+
+    assert asyncio.run(run()) == "theirs"
+    assert calls == []
+    assert cache.coalesced_calls["distributed"] > 0
+
+
+def test_changed_versions_are_reloaded(monkeypatch):
+    monkeypatch.setattr(cache, "LOCAL_VERSION_CHECK", True)
+    # Check the version in redis on every call.
+    monkeypatch.setattr(cache, "local_cache", cache.LocalCache(16, ttl=0))
+    calls = []
+
+    @cache_this(freshness=timedelta(hours=1))
+    async def get_value():
+        calls.append(1)
+        return "mine"
+
+    async def run():
+        assert await get_value() == "mine"
+        assert await get_value() == "mine"
+        # Another process stores a new version of the entry.
+        await cache.cache.set("[RESULT] get_value ((), {})", "theirs")
+        return await get_value()
+
+    assert asyncio.run(run()) == "theirs"
+    assert len(calls) == 1
+
+
+def test_local_cache_evicts_the_least_recently_used_entries():
+    local_cache = cache.LocalCache(max_entries=2, ttl=60)
+    now = datetime.now(timezone.utc)
+    local_cache.set("a", now, 1)
+    local_cache.set("b", now, 2)
+    local_cache.get("a")
+    local_cache.set("c", now, 3)
+
+    assert local_cache.get("b") is None
+    assert local_cache.get("a").value == 1
+    assert local_cache.get("c").value == 3
+    assert cache.LocalCache(max_entries=0, ttl=60).set("a", now, 1).value == 1
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import cache
+import counters
+from backends import MemoryBackend
+from utils import CalendarType, TeamAbbrev
+
+
+class FailingBackend(MemoryBackend):
+    """Fails to write counts, as if redis were down."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.writes = 0
+
+    async def hincrby_many(self, key, increments):
+        self.writes += 1
+        raise ConnectionError("redis is down")
+
+
+@pytest.fixture(autouse=True)
+def reset_counters(monkeypatch):
+    """Flush as soon as a single call is counted, starting without pending counts."""
+    monkeypatch.setattr(counters, "MAX_PENDING", 1)
+    monkeypatch.setattr(counters, "_pending_counts", counters.Counter())
+    monkeypatch.setattr(counters, "_flush_task", None)
+    monkeypatch.setattr(counters, "_failed_flushes", 0)
+    monkeypatch.setattr(counters, "_next_flush_at", 0.0)
+
+
+@counters.count_this
+async def get_calendar(calendar_type: CalendarType, team: TeamAbbrev) -> None:
+    pass
+
+
+async def _count_calls(calls: int) -> None:
+    for _ in range(calls):
+        await get_calendar(calendar_type=CalendarType.FULL, team=TeamAbbrev.BOS)
+        # Let started flushes run.
+        await asyncio.sleep(0.01)
+
+
+def test_counts_are_flushed_in_batches():
+    asyncio.run(_count_calls(5))
+    counts = asyncio.run(cache.cache.get_set("request_counts"))
+    assert counts == {"BOS-FULL-CAL": "5", "BOS-FULL": "5", "BOS": "5"}
+
+
+def test_failed_flushes_back_off(monkeypatch):
+    backend = FailingBackend()
+    monkeypatch.setattr(cache.cache, "backend", backend)
+
+    asyncio.run(_count_calls(50))
+
+    # Only the first flush was tried; the others wait for the backoff instead of piling up.
+    assert backend.writes == 1
+    assert counters._pending_counts["BOS-FULL-CAL"] == 50
+    assert counters._failed_flushes == 1
+
+
+def test_flusher_doesnt_spin_without_an_interval(monkeypatch):
+    monkeypatch.setattr(counters, "FLUSH_INTERVAL", 0)
+    checks = []
+    monkeypatch.setattr(counters, "_can_flush", lambda: checks.append(1) or False)
+
+    async def run():
+        flusher = asyncio.create_task(counters.run_counter_flusher())
+        await asyncio.sleep(0.1)
+        flusher.cancel()
+
+    asyncio.run(run())
+    assert checks == []
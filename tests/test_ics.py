@@ -0,0 +1,144 @@
+"""Golden-file tests for the ics writer, and a comparison with the icalendar package it replaced.
+
+The ics writer must produce the same bytes icalendar 6.2.0 did, so calendar clients (and their
+caches) see no difference. To update the golden files after an intended change to the output:
+
+    UPDATE_GOLDEN=1 python -m pytest tests/test_ics.py
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from os.path import join
+from typing import Iterable, List
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import main
+from ics import iter_calendar
+from tests.conftest import FIXTURES_DIR, load_fixture
+from utils import CalendarType, Game, TeamAbbrev
+
+DTSTAMP = datetime(2025, 9, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def _schedule():
+    return asyncio.run(main._parse_schedule(TeamAbbrev.BOS, load_fixture("BOS.json")))
+
+
+def _render(calname: str, games: Iterable[Game]) -> bytes:
+    return b"".join(iter_calendar(calname, games, dtstamp=DTSTAMP))
+
+
+@pytest.mark.parametrize("cal_type", list(CalendarType))
+def test_calendars_match_golden_files(cal_type: CalendarType):
+    schedule = _schedule()
+    content = b"".join(
+        main._render_calendar(
+            TeamAbbrev.BOS, cal_type, schedule.games_for(cal_type), DTSTAMP
+        )
+    )
+
+    path = join(FIXTURES_DIR, f"BOS_{cal_type.value}.ics")
+    if os.getenv("UPDATE_GOLDEN"):
+        with open(path, "wb") as f:
+            f.write(content)
+    with open(path, "rb") as f:
+        assert content == f.read()
+
+
+def _render_with_icalendar(calname: str, games: Iterable[Game]) -> bytes:
+    """Render the calendar the way the app did before the ics writer replaced icalendar."""
+    icalendar = pytest.importorskip("icalendar")
+
+    cal = icalendar.Calendar()
+    cal.add("prodid", "-//Puckdex//puckdex.cbdm.app//EN")
+    cal.add("version", "2.0")
+    cal.add("METHOD", "PUBLISH")
+    cal.add("X-WR-CALNAME", calname)
+    cal.add("X-WR-TIMEZONE", "UTC")
+
+    dtstamp = DTSTAMP.astimezone(ZoneInfo("UTC"))
+    for game in games:
+        home_score = f"({game.home_score}) " if game.ended else ""
+        away_score = f" ({game.away_score})" if game.ended else ""
+        game_info = (
+            f"{game.away_team_name}{away_score} @ {home_score}{game.home_team_name}"
+        )
+        extra_info = ""
+        if game.where_to_watch:
+            extra_info += f"Where to watch: {', '.join(game.where_to_watch)}\n"
+
+        event = icalendar.Event()
+        event.add("summary", game_info)
+        event.add("dtstamp", dtstamp)
+        event.add("dtstart", game.start)
+        event.add("dtend", game.start + game.length)
+        if game.venue:
+            event.add("location", game.venue)
+        if extra_info:
+            event.add("description", extra_info.strip())
+        local_uid = (
+            f"{game.start.date()}_{game.home_team_abbrev}_{game.away_team_abbrev}"
+        )
+        event.add("uid", f"{local_uid}@puckdex.cbdm.app")
+        cal.add_component(event)
+    return cal.to_ical()
+
+
+# Text that needs escaping, multi-octet characters, and pieces that make long lines.
+TEXT_PIECES = [
+    "Montréal",
+    "München",
+    "Årena",
+    "ßÇ€",
+    "😀",
+    "a, b",
+    "c; d",
+    "back\\slash",
+    "two\nlines",
+    "Scotiabank Arena",
+    "x" * 70,
+]
+
+
+def _random_text(rnd: random.Random) -> str:
+    return " ".join(rnd.choice(TEXT_PIECES) for _ in range(rnd.randint(1, 8)))
+
+
+def _random_games(rnd: random.Random) -> List[Game]:
+    start = datetime(2025, 10, 1, tzinfo=timezone.utc)
+    return [
+        Game(
+            home_team_abbrev=rnd.choice(["BOS", "MTL", "RBM"]),
+            home_team_name=_random_text(rnd),
+            away_team_abbrev=rnd.choice(["TOR", "UTA"]),
+            away_team_name=_random_text(rnd),
+            start_utc_timestamp=(
+                start + timedelta(days=i, minutes=rnd.randint(0, 600))
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            ended=rnd.random() < 0.5,
+            home_score=rnd.randint(0, 9),
+            away_score=rnd.randint(0, 9),
+            venue=_random_text(rnd) if rnd.random() < 0.8 else "",
+            where_to_watch=[_random_text(rnd) for _ in range(rnd.randint(0, 3))],
+        )
+        for i in range(rnd.randint(0, 12))
+    ]
+
+
+def test_fixture_matches_icalendar():
+    games = _schedule().games_for(CalendarType.FULL)
+    assert _render("Boston Bruins - Full Calendar", games) == _render_with_icalendar(
+        "Boston Bruins - Full Calendar", games
+    )
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_calendars_match_icalendar(seed: int):
+    rnd = random.Random(seed)
+    calname = _random_text(rnd)
+    games = _random_games(rnd)
+    assert _render(calname, games) == _render_with_icalendar(calname, games)
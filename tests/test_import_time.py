@@ -0,0 +1,16 @@
+import statistics
+
+import pytest
+
+from benchmarks.import_time import find_eager_imports, measure_import_ms
+
+IMPORT_BUDGET_MS = 800
+
+
+def test_slow_modules_are_imported_on_first_use():
+    assert find_eager_imports() == []
+
+
+@pytest.mark.timing
+def test_app_imports_within_budget():
+    assert statistics.median(measure_import_ms() for _ in range(5)) <= IMPORT_BUDGET_MS
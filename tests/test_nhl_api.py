@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+import nhl_api
+from nhl_api import NHLAPIError
+from tests.conftest import use_nhl_api
+
+
+def test_other_routes_are_served_while_a_fetch_hangs(monkeypatch):
+    async def run():
+        fetch_started = asyncio.Event()
+
+        async def never_responds(request: httpx.Request) -> httpx.Response:
+            fetch_started.set()
+            await asyncio.Event().wait()
+
+        use_nhl_api(monkeypatch, never_responds)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as app:
+            calendar = asyncio.create_task(app.get("/full/BOS.ics"))
+            await asyncio.wait_for(fetch_started.wait(), timeout=5)
+
+            # The hanging fetch doesn't block the event loop, so other routes still respond.
+            about = await asyncio.wait_for(app.get("/about"), timeout=5)
+            assert about.status_code == 200
+            assert not calendar.done()
+            calendar.cancel()
+
+    asyncio.run(run())
+
+
+def test_temporary_failures_are_retried(monkeypatch):
+    requests = []
+
+    def flaky(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        if len(requests) == 2:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"games": []})
+
+    use_nhl_api(monkeypatch, flaky)
+    assert asyncio.run(nhl_api.fetch_schedule("BOS")) == {"games": []}
+    assert len(requests) == 3
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    requests = []
+
+    def not_found(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(404)
+
+    use_nhl_api(monkeypatch, not_found)
+    with pytest.raises(NHLAPIError) as e:
+        asyncio.run(nhl_api.fetch_schedule("BOS"))
+    assert e.value.status_code == 404
+    assert len(requests) == 1
+
+
+def test_checking_the_circuit_does_not_use_the_probe(monkeypatch):
+    breaker = nhl_api.CircuitBreaker(failures=1, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    # Once the timeout has passed, the circuit isn't open, and the probe can still be sent.
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - 30)
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert not breaker.allow()
@@ -0,0 +1,58 @@
+import asyncio
+from typing import List
+
+import httpx
+import pytest
+
+import main
+from utils import LRUCache
+
+
+@pytest.fixture
+def renders(monkeypatch) -> List[str]:
+    """Start without rendered pages and record the sites each page is rendered for."""
+    renders = []
+    render_page = main._render_page
+
+    def counting_render_page(name, context, site_url):
+        renders.append(site_url)
+        return render_page(name, context, site_url)
+
+    monkeypatch.setattr(main, "_rendered_pages", LRUCache(main.PAGE_CACHE_SIZE))
+    monkeypatch.setattr(main, "_render_page", counting_render_page)
+    return renders
+
+
+def _get_about(hosts: List[str]) -> List[httpx.Response]:
+    async def get(host: str) -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url=host) as app:
+            return await app.get("/about")
+
+    async def scenario():
+        return await asyncio.gather(*(get(host) for host in hosts))
+
+    return asyncio.run(scenario())
+
+
+def test_pages_are_rendered_once_for_all_hosts_with_a_site_url(monkeypatch, renders):
+    monkeypatch.setattr(main, "SITE_URL", "https://puckdex.example")
+
+    responses = _get_about([f"http://host{i}.example" for i in range(10)])
+
+    assert renders == ["https://puckdex.example"]
+    assert {r.content for r in responses} == {responses[0].content}
+    assert b"https://puckdex.example/home/CAR.ics" in responses[0].content
+    assert b"host0.example" not in responses[0].content
+
+
+def test_pages_link_to_the_requested_host_without_a_site_url(monkeypatch, renders):
+    monkeypatch.setattr(main, "SITE_URL", "")
+    hosts = [f"http://host{i}.example" for i in range(main.PAGE_CACHE_SIZE + 1)]
+
+    responses = _get_about(hosts + hosts[-1:])
+
+    # Each host's page is rendered once, and only the most recent ones are kept.
+    assert renders == hosts
+    assert b"http://host0.example/home/CAR.ics" in responses[0].content
+    assert len(main._rendered_pages) == main.PAGE_CACHE_SIZE
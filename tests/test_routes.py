@@ -0,0 +1,123 @@
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+import httpx
+import pytest
+
+import main
+from benchmarks.fixtures import load_schedule
+from tests.conftest import use_nhl_api
+from utils import LRUCache, TeamAbbrev
+
+
+@pytest.fixture(autouse=True)
+def nothing_rendered(monkeypatch):
+    """Start without calendars rendered by other tests."""
+    monkeypatch.setattr(main, "_rendered_calendars", {})
+    monkeypatch.setattr(main, "_rendered_combos", LRUCache(main.COMBO_CACHE_SIZE))
+    monkeypatch.setattr(main, "_rendered_windows", LRUCache(main.WINDOW_CACHE_SIZE))
+
+
+def _serve_schedules(monkeypatch, schedule_for: Callable[[str], Dict]) -> None:
+    """Answer requests for a team's current schedule with schedule_for(team)."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        team = request.url.path.split("/")[-2]
+        return httpx.Response(200, json=schedule_for(team))
+
+    use_nhl_api(monkeypatch, handler)
+
+
+def _get_all(paths: List[str]) -> List[httpx.Response]:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as app:
+            return [await app.get(path) for path in paths]
+
+    return asyncio.run(run())
+
+
+def _uids(calendar: bytes) -> List[str]:
+    return re.findall(r"^UID:(.*?)\r?$", calendar.decode("utf-8"), re.M)
+
+
+def test_combos_keep_head_to_head_games_once(monkeypatch):
+    _serve_schedules(monkeypatch, lambda team: load_schedule(TeamAbbrev(team)))
+
+    combo, reordered, bos, tor = _get_all(
+        [
+            "/combo/full.ics?teams=BOS,TOR",
+            "/combo/full.ics?teams=tor,BOS,bos",
+            "/full/BOS.ics",
+            "/full/TOR.ics",
+        ]
+    )
+
+    uids = _uids(combo.content)
+    head_to_head = set(_uids(bos.content)) & set(_uids(tor.content))
+    assert head_to_head
+    assert len(uids) == len(set(uids))
+    assert set(uids) == set(_uids(bos.content)) | set(_uids(tor.content))
+    # The same teams in any order are the same calendar.
+    assert reordered.headers["etag"] == combo.headers["etag"]
+    assert reordered.content == combo.content
+
+
+def _game(opponent: str, start: datetime) -> Dict:
+    return {
+        "startTimeUTC": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "gameState": "FUT",
+        "venue": {"default": "TD Garden"},
+        "homeTeam": {"abbrev": "BOS", "commonName": {"default": "Bruins"}},
+        "awayTeam": {"abbrev": opponent, "commonName": {"default": opponent}},
+    }
+
+
+def test_windows_are_aligned_to_whole_days(monkeypatch):
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    window_start = today - timedelta(days=1)
+    window_end = today + timedelta(days=2)
+    length = timedelta(hours=3)
+    games = [
+        # Ends right as the window starts.
+        _game("TOR", window_start - length),
+        # Ends a minute into the window.
+        _game("MTL", window_start - length + timedelta(minutes=1)),
+        # Starts a minute before the window ends.
+        _game("OTT", window_end - timedelta(minutes=1)),
+        # Starts right as the window ends.
+        _game("BUF", window_end),
+    ]
+    _serve_schedules(
+        monkeypatch, lambda team: {"currentSeason": 20252026, "games": games}
+    )
+
+    (response,) = _get_all(["/full/BOS.ics?past_days=1&future_days=1"])
+
+    assert [uid.split("@")[0].split("_")[-1] for uid in _uids(response.content)] == [
+        "MTL",
+        "OTT",
+    ]
+
+
+@pytest.mark.parametrize("kind", ["next", "last"])
+def test_bulk_games_match_single_team_games(monkeypatch, kind):
+    _serve_schedules(monkeypatch, lambda team: load_schedule(TeamAbbrev(team)))
+    teams = ["BOS", "TOR", "MTL"]
+
+    bulk, *singles = _get_all(
+        [f"/{kind}/home?teams={','.join(teams)}"]
+        + [f"/{kind}/home/{team}" for team in teams]
+    )
+
+    assert bulk.status_code == 200
+    assert json.loads(bulk.content) == {
+        team: single.json() for team, single in zip(teams, singles)
+    }
@@ -0,0 +1,115 @@
+import asyncio
+import copy
+
+import cache
+import main
+from backends import MemoryBackend
+from tests.conftest import load_fixture
+from utils import CalendarType, GameStore, Schedule, TeamAbbrev
+
+
+def _parse(data, previous=None):
+    return asyncio.run(main._parse_schedule(TeamAbbrev.BOS, data, previous))
+
+
+def test_unchanged_refresh_keeps_the_version():
+    data = load_fixture("BOS.json")
+    schedule = _parse(data)
+
+    # The NHL API doesn't promise an order for broadcasts.
+    reordered = copy.deepcopy(data)
+    for game in reordered["games"]:
+        game["tvBroadcasts"].reverse()
+    refreshed = _parse(reordered, previous=schedule)
+
+    assert refreshed.version == schedule.version
+    assert refreshed.view_updated == schedule.view_updated
+    assert refreshed.timestamp > schedule.timestamp
+
+
+def test_changed_game_only_updates_its_views():
+    data = load_fixture("BOS.json")
+    schedule = _parse(data)
+
+    changed = copy.deepcopy(data)
+    # A home game gets a new broadcast.
+    changed["games"][2]["tvBroadcasts"].append(
+        {"id": 1, "market": "N", "countryCode": "US", "network": "TNT"}
+    )
+    refreshed = _parse(changed, previous=schedule)
+
+    assert refreshed.version == schedule.version + 1
+    assert refreshed.updated_at(CalendarType.AWAY) == schedule.updated_at(
+        CalendarType.AWAY
+    )
+    assert refreshed.updated_at(CalendarType.HOME) != schedule.updated_at(
+        CalendarType.HOME
+    )
+    assert refreshed.updated_at(CalendarType.FULL) != schedule.updated_at(
+        CalendarType.FULL
+    )
+
+
+class CountingBackend(MemoryBackend):
+    """Counts the reads of multiple values."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.get_many_calls = 0
+
+    async def get_many(self, keys):
+        self.get_many_calls += 1
+        return await super().get_many(keys)
+
+
+def test_games_are_cached_once_for_both_teams(monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setattr(cache.cache, "backend", backend)
+    bos = _parse(load_fixture("BOS.json"))
+    # TOR's schedule holds the same games against BOS as BOS's schedule.
+    tor = Schedule(
+        team=TeamAbbrev.TOR,
+        season=bos.season,
+        games=[
+            g for g in bos.games if "TOR" in (g.home_team_abbrev, g.away_team_abbrev)
+        ],
+        timestamp=bos.timestamp,
+    )
+    assert tor.games
+
+    async def scenario():
+        return await main._dump_schedule(bos), await main._dump_schedule(tor)
+
+    bos_data, tor_data = asyncio.run(scenario())
+
+    game_keys = [k for k in backend._values if k.startswith("[GAME]")]
+    assert len(game_keys) == len(bos.games)
+    assert set(tor_data["games"]) <= set(bos_data["games"])
+
+    # Without the games in memory, they're all read back with a single request.
+    monkeypatch.setattr(main, "game_store", GameStore())
+    loaded = asyncio.run(main._load_schedule(bos_data))
+    assert backend.get_many_calls == 1
+    assert loaded.games == bos.games
+    assert loaded.version == bos.version
+
+
+def test_schedules_whose_games_expired_are_not_loaded(monkeypatch):
+    backend = MemoryBackend()
+    monkeypatch.setattr(cache.cache, "backend", backend)
+    schedule = _parse(load_fixture("BOS.json"))
+    data = asyncio.run(main._dump_schedule(schedule))
+
+    del backend._values[data["games"][0]]
+    monkeypatch.setattr(main, "game_store", GameStore())
+
+    assert asyncio.run(main._load_schedule(data)) is None
+
+
+def test_schedules_cached_with_their_games_are_still_loaded():
+    schedule = _parse(load_fixture("BOS.json"))
+    data = schedule.model_dump(mode="json")
+
+    loaded = asyncio.run(main._load_schedule(data))
+
+    assert loaded.games == schedule.games
@@ -1,21 +1,49 @@
 import logging
-from datetime import timedelta
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import List
+from functools import cached_property
+from hashlib import sha256
+from os import getenv
+from typing import Any, Dict, List, Optional, Tuple
+from weakref import WeakValueDictionary
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment ("1", "true" or "yes" turn it on)."""
+    value = getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes"}
 
-from pydantic import BaseModel, Field
 
 # Configure logging message format.
+# Per-request messages are logged at INFO; set LOG_LEVEL=WARNING to skip them under heavy load.
 LOGGER_FORMAT = "%(name)s %(asctime)s %(levelname)s %(message)s"
-LOGGER_LEVEL = logging.INFO
+LOGGER_LEVEL = getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(format=LOGGER_FORMAT, level=LOGGER_LEVEL)
 
 # URL for the NHL API that provides team's schedules;
 # ref: https://github.com/Zmalski/NHL-API-Reference
 SCHEDULE_API_URL = "https://api-web.nhle.com/v1/club-schedule-season/{team_abbrev}/now"
+# Same, for a specific season (e.g., 20232024).
+SEASON_SCHEDULE_API_URL = (
+    "https://api-web.nhle.com/v1/club-schedule-season/{team_abbrev}/{season}"
+)
 
 # How often the schedule should be updated.
 UPDATE_FREQ = timedelta(hours=36)
+# Update more often around games (scores and broadcasts change) and less often when there are none.
+GAME_DAY_UPDATE_FREQ = timedelta(hours=1)
+GAME_DAY_WINDOW = timedelta(hours=12)
+OFF_SEASON_UPDATE_FREQ = timedelta(days=7)
+OFF_SEASON_GAP = timedelta(days=14)
+
+# How old a schedule can get while still being served as it's refreshed in the background.
+MAX_STALENESS = timedelta(hours=72)
 
 # Map team abbreviations to their full names.
 ABBREV_TO_NAME_MAP = {
@@ -91,6 +119,14 @@ class TeamAbbrev(str, Enum):
     WSH = "WSH"
 
 
+class CalendarType(str, Enum):
+    """Possible types of calendars served."""
+
+    FULL = "full"
+    HOME = "home"
+    AWAY = "away"
+
+
 class Game(BaseModel):
     """Holds information for a single game."""
 
@@ -103,6 +139,8 @@ class Game(BaseModel):
     )
     away_team_name: str
     start_utc_timestamp: str
+    # NHL game ID; 0 when unknown (e.g., schedules cached before it was added).
+    game_id: int = 0
     length: timedelta = timedelta(hours=3)
     ended: bool = False
     home_score: int = 0
@@ -110,6 +148,83 @@ class Game(BaseModel):
     venue: str = ""
     where_to_watch: List[str] = Field(default_factory=list)
 
+    @cached_property
+    def start(self) -> datetime:
+        """When the game starts."""
+        return datetime.fromisoformat(self.start_utc_timestamp)
+
+    @cached_property
+    def end(self) -> datetime:
+        """When the game is expected to end."""
+        return self.start + self.length
+
+    @cached_property
+    def digest(self) -> str:
+        """Short hash of all the game's fields; it changes whenever any of them changes."""
+        return sha256(self.model_dump_json().encode()).hexdigest()[:16]
+
+
+class LRUCache(OrderedDict):
+    """Keeps at most max_size entries, evicting the least recently used ones."""
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return the value for the key (marking it as recently used), or default if there's none."""
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        """Store the value for the key, evicting the least recently used entries if full."""
+        self[key] = value
+        self.move_to_end(key)
+        while self and len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class GameStore:
+    """Shares a single instance of each game among all schedules in the process.
+
+    Every game appears in the schedules of both teams playing it, so sharing instances halves
+    the games kept in memory and lets a refresh skip building games that didn't change.
+    Games are dropped from the store once no schedule holds them anymore.
+    """
+
+    def __init__(self) -> None:
+        self._games: "WeakValueDictionary[int, Game]" = WeakValueDictionary()
+
+    def get_or_create(self, game_id: int, **fields: Any) -> Game:
+        """Return the stored game if it has the same fields, otherwise create and store a new one."""
+        game = self._games.get(game_id) if game_id else None
+        if game is not None and all(getattr(game, k) == v for k, v in fields.items()):
+            return game
+        return self.intern(Game(game_id=game_id, **fields))
+
+    def get(self, game_id: int) -> Optional[Game]:
+        """Return the stored game with the ID, if any schedule still holds it."""
+        return self._games.get(game_id)
+
+    def intern(self, game: Game) -> Game:
+        """Return the stored instance equal to game, storing game if there isn't one."""
+        if not game.game_id:
+            return game
+        stored = self._games.get(game.game_id)
+        if stored is not None and (stored is game or stored == game):
+            return stored
+        self._games[game.game_id] = game
+        return game
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+
+# Share games across schedules.
+game_store: GameStore = GameStore()
+
 
 class Schedule(BaseModel):
     """Holds information for all games in a season for a team."""
@@ -117,12 +232,165 @@ class Schedule(BaseModel):
     team: TeamAbbrev
     season: int
     games: List[Game]
-    timestamp: str
+    timestamp: str  # When the schedule was last fetched.
+    # Bumped every time a refresh changes the games.
+    version: int = 0
+    # When the games of each calendar type last changed.
+    view_updated: Dict[CalendarType, str] = {}
 
+    # Games for each calendar type and when each of them starts/ends, built once per schedule.
+    _views: Dict[CalendarType, List[Game]] = PrivateAttr(default_factory=dict)
+    _view_starts: Dict[CalendarType, List[datetime]] = PrivateAttr(default_factory=dict)
+    _view_ends: Dict[CalendarType, List[datetime]] = PrivateAttr(default_factory=dict)
 
-class CalendarType(str, Enum):
-    """Possible types of calendars served."""
+    def model_post_init(self, __context: Any) -> None:
+        """Sort the games and index them by calendar type."""
+        # Lookups by time depend on the games being sorted.
+        # As of 2025-03-16 the NHL API response is already sorted, so this rarely has to sort anything.
+        if any(a.start > b.start for a, b in zip(self.games, self.games[1:])):
+            self.games = sorted(self.games, key=lambda g: g.start)
 
-    FULL = "full"
-    HOME = "home"
-    AWAY = "away"
+        # Use the same game instances as other schedules (e.g., when loaded from the cache).
+        self.games = [game_store.intern(g) for g in self.games]
+
+        # New schedules (and the ones cached before views were tracked) changed when they were fetched.
+        if not self.view_updated:
+            self.view_updated = {cal_type: self.timestamp for cal_type in CalendarType}
+
+        self._views = {
+            CalendarType.FULL: self.games,
+            CalendarType.HOME: [
+                g for g in self.games if g.home_team_abbrev == self.team
+            ],
+            CalendarType.AWAY: [
+                g for g in self.games if g.away_team_abbrev == self.team
+            ],
+        }
+        self._view_starts = {
+            cal_type: [g.start for g in games]
+            for cal_type, games in self._views.items()
+        }
+        # All games have the same length, so sorting them by start also sorts them by end.
+        self._view_ends = {
+            cal_type: [g.end for g in games] for cal_type, games in self._views.items()
+        }
+
+    def games_for(self, cal_type: CalendarType) -> List[Game]:
+        """Return the games that match the calendar type, sorted by start."""
+        return self._views[cal_type]
+
+    def games_between(
+        self,
+        cal_type: CalendarType,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ) -> List[Game]:
+        """Return the games (of the calendar type) that end after start and start before end.
+
+        Either bound can be None to not limit the games on that side.
+        """
+        games = self._views[cal_type]
+        first = bisect_right(self._view_ends[cal_type], start) if start else 0
+        last = bisect_left(self._view_starts[cal_type], end) if end else len(games)
+        return games[first:last]
+
+    def next_game(self, cal_type: CalendarType, now: datetime) -> Optional[Game]:
+        """Return the first game (of the calendar type) that ends after now, if there is one."""
+        games = self._views[cal_type]
+        i = bisect_right(self._view_ends[cal_type], now)
+        return games[i] if i < len(games) else None
+
+    def last_game(self, cal_type: CalendarType, now: datetime) -> Optional[Game]:
+        """Return the last game (of the calendar type) that ended before now, if there is one."""
+        i = bisect_left(self._view_ends[cal_type], now)
+        return self._views[cal_type][i - 1] if i > 0 else None
+
+    def updated_at(self, cal_type: CalendarType) -> str:
+        """Return when the games of the calendar type last changed."""
+        return self.view_updated[cal_type]
+
+    def update_freq(self, now: datetime) -> timedelta:
+        """Return how long the schedule stays fresh, based on how close it is to a game."""
+        next_game = self.next_game(CalendarType.FULL, now)
+        last_game = self.last_game(CalendarType.FULL, now)
+        # A game is about to start, is being played, or ended without a final score yet.
+        if (next_game is not None and next_game.start - now <= GAME_DAY_WINDOW) or (
+            last_game is not None
+            and not last_game.ended
+            and now - last_game.end <= GAME_DAY_WINDOW
+        ):
+            return GAME_DAY_UPDATE_FREQ
+        if next_game is None or next_game.start - now >= OFF_SEASON_GAP:
+            return OFF_SEASON_UPDATE_FREQ
+        return UPDATE_FREQ
+
+    def updated_with(
+        self, season: int, games: List[Game], timestamp: str
+    ) -> "Schedule":
+        """Return this schedule refreshed with the given games, only changing what's different."""
+        if season == self.season and games == self.games:
+            # Nothing changed, so everything derived from the schedule is still valid.
+            return self.model_copy(update={"timestamp": timestamp})
+
+        schedule = Schedule(
+            team=self.team,
+            season=season,
+            games=games,
+            timestamp=timestamp,
+            version=self.version + 1,
+        )
+        # Unchanged games are shared with this schedule, so most comparisons are by identity.
+        schedule.view_updated = {
+            cal_type: (
+                self.updated_at(cal_type)
+                if season == self.season
+                and schedule.games_for(cal_type) == self.games_for(cal_type)
+                else timestamp
+            )
+            for cal_type in CalendarType
+        }
+        return schedule
+
+
+class UpcomingGames:
+    """League-wide table with the last and next game of each team, for lookups of many teams at once.
+
+    Schedules are added as they're refreshed (or loaded from the cache), and a team's games are
+    only searched again once its schedule changes or its next game ends.
+    """
+
+    def __init__(self) -> None:
+        self._schedules: Dict[TeamAbbrev, Schedule] = {}
+        # The last and next game for each team and calendar type.
+        self._games: Dict[
+            Tuple[TeamAbbrev, CalendarType], Tuple[Optional[Game], Optional[Game]]
+        ] = {}
+
+    def update(self, schedule: Schedule) -> None:
+        """Use the schedule for its team, forgetting the games found in a different version of it."""
+        previous = self._schedules.get(schedule.team)
+        self._schedules[schedule.team] = schedule
+        if previous is not None and (
+            previous.season != schedule.season
+            or previous.view_updated != schedule.view_updated
+        ):
+            for cal_type in CalendarType:
+                self._games.pop((schedule.team, cal_type), None)
+
+    def lookup(
+        self, team: TeamAbbrev, cal_type: CalendarType, now: datetime
+    ) -> Tuple[Optional[Game], Optional[Game]]:
+        """Return the last and next game (of the calendar type) of a team whose schedule was added."""
+        games = self._games.get((team, cal_type))
+        if games is None or (games[1] is not None and games[1].end <= now):
+            schedule = self._schedules[team]
+            games = (
+                schedule.last_game(cal_type, now),
+                schedule.next_game(cal_type, now),
+            )
+            self._games[(team, cal_type)] = games
+        return games
+
+
+# Keep the last and next games of all teams.
+upcoming_games: UpcomingGames = UpcomingGames()
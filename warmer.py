@@ -0,0 +1,129 @@
+"""Refresh the cached team schedules before they expire, so requests never wait on the NHL API.
+
+Run it as a single process next to the app, or once at a time (e.g., from a cron job):
+
+    python warmer.py --loop
+    python warmer.py [--force]
+
+It can also run in the background of each app worker with WARMER_ENABLED=true (see main.py).
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from os import getenv
+from typing import List
+
+from cache import cache
+from main import _create_complete_schedule, _get_rendered_calendar
+from nhl_api import nhl_api
+from utils import CalendarType, TeamAbbrev
+
+logger = logging.getLogger(getenv("LOGGER_NAME", __name__))
+
+# How often (in seconds) to check which schedules need a refresh.
+WARM_INTERVAL = float(getenv("WARMER_INTERVAL", "900"))
+# Refresh schedules that would stop being fresh within this time.
+# It should be longer than WARM_INTERVAL so no schedule expires between two checks.
+LEAD_TIME = timedelta(seconds=float(getenv("WARMER_LEAD_TIME", "3600")))
+# How many schedules can be refreshed at the same time.
+MAX_PARALLEL = int(getenv("WARMER_MAX_PARALLEL", "2"))
+# How long (in seconds) to wait between starting two refreshes, so the NHL API isn't hit all at once.
+STAGGER = float(getenv("WARMER_STAGGER", "2"))
+
+
+async def _needs_refresh(team: TeamAbbrev) -> bool:
+    """Check if the team's schedule is missing or about to stop being fresh."""
+    entry = await _create_complete_schedule.get_entry(team)
+    if entry is None:
+        return True
+    entry_age = datetime.now(timezone.utc) - entry.timestamp
+    freshness = _create_complete_schedule.get_freshness(entry.value)
+    # Don't refresh schedules that are only fresh for a short time (e.g., on game days) at every check.
+    return entry_age >= freshness - min(LEAD_TIME, freshness / 2)
+
+
+async def warm_team(team: TeamAbbrev, force: bool = False) -> bool:
+    """Refresh the team's schedule if needed and pre-render its calendars; return if it was refreshed."""
+    refreshed = False
+    if force or await _needs_refresh(team):
+        logger.info("Warming schedule for %s.", team.name)
+        await _create_complete_schedule.refresh(team)
+        refreshed = True
+
+    # Rendering is skipped for calendars that are already up to date with the schedule.
+    for cal_type in CalendarType:
+        await _get_rendered_calendar(team, cal_type)
+
+    return refreshed
+
+
+async def warm_all(force: bool = False) -> List[TeamAbbrev]:
+    """Warm all teams with bounded parallelism; return the teams that were refreshed."""
+    semaphore = asyncio.Semaphore(MAX_PARALLEL)
+
+    async def warm_with_limit(team: TeamAbbrev, delay: float) -> bool:
+        await asyncio.sleep(delay)
+        async with semaphore:
+            return await warm_team(team, force)
+
+    # Only stagger the teams that will actually be refreshed.
+    teams = list(TeamAbbrev)
+    if force:
+        stale_teams = teams
+    else:
+        needs_refresh = await asyncio.gather(*(_needs_refresh(t) for t in teams))
+        stale_teams = [t for t, stale in zip(teams, needs_refresh) if stale]
+    delays = {t: i * STAGGER for i, t in enumerate(stale_teams)}
+    results = await asyncio.gather(
+        *(warm_with_limit(t, delays.get(t, 0)) for t in teams),
+        return_exceptions=True,
+    )
+
+    refreshed: List[TeamAbbrev] = []
+    for team, result in zip(teams, results):
+        if isinstance(result, BaseException):
+            logger.error("Error warming schedule for %s: %s", team.name, result)
+        elif result:
+            refreshed.append(team)
+    logger.info(
+        "Warmed %d schedules: %s", len(refreshed), ", ".join(t.name for t in refreshed)
+    )
+    return refreshed
+
+
+async def run_warmer() -> None:
+    """Keep warming schedules; meant to run in the background for the app's lifetime."""
+    while True:
+        try:
+            await warm_all()
+        except Exception as e:
+            logger.exception("Error warming schedules: %s", e)
+        await asyncio.sleep(WARM_INTERVAL)
+
+
+async def _warm_from_cli(force: bool, loop: bool) -> None:
+    """Warm all teams (once, or until stopped) and release the resources used to do it."""
+    try:
+        if loop:
+            await run_warmer()
+        else:
+            await warm_all(force)
+    finally:
+        await nhl_api.aclose()
+        await cache.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="refresh all schedules, even fresh ones"
+    )
+    parser.add_argument(
+        "--loop",
+        action="store_true",
+        help=f"keep warming schedules every WARMER_INTERVAL ({WARM_INTERVAL:g}) seconds",
+    )
+    args = parser.parse_args()
+    asyncio.run(_warm_from_cli(force=args.force, loop=args.loop))